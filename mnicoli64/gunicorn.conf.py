@@ -0,0 +1,70 @@
+"""
+Configurazione di Gunicorn per l'avvio in produzione:
+
+    gunicorn -c gunicorn.conf.py
+
+Tutti i parametri si possono sovrascrivere con variabili d'ambiente GUNICORN_*.
+Per servire l'applicazione ASGI (mnicoli64/asgi.py) impostare
+GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker.
+"""
+
+import multiprocessing
+import os
+import shutil
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+_asgi = worker_class.startswith("uvicorn")
+
+# applicazione WSGI o ASGI a seconda del tipo di worker
+wsgi_app = os.environ.get(
+    "GUNICORN_APP",
+    "mnicoli64.asgi:application" if _asgi else "mnicoli64.wsgi:application",
+)
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+# (2 x core) + 1 processi, salvo override esplicito
+workers = _env_int("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+threads = _env_int("GUNICORN_THREADS", 1 if _asgi else 4)
+
+# keep-alive più lungo del timeout di inattività del proxy davanti (tipicamente 60s
+# per i load balancer) evita connessioni chiuse a metà richiesta
+keepalive = _env_int("GUNICORN_KEEPALIVE", 75)
+timeout = _env_int("GUNICORN_TIMEOUT", 60)
+
+# riavvii graceful: SIGHUP ricarica i worker, che hanno graceful_timeout
+# secondi per completare le richieste in corso
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# ricicla periodicamente i worker (con jitter per non riavviarli tutti insieme)
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+# in sviluppo (DJANGO_DEBUG=1) ricarica il codice come runserver
+reload = os.environ.get("DJANGO_DEBUG", "").lower() in ("1", "true", "yes", "on")
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+# metriche Prometheus multiprocesso (sistema_gestione_veicoli/metrics.py):
+# la directory va svuotata all'avvio e i file dei worker terminati marcati
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,40 @@
+"""
+Backend PostgreSQL con pool di connessioni in-process.
+
+Si attiva con ENGINE = "mnicoli64.db.pooled_postgresql" (o DB_POOL=1, vedi
+settings.py) e si configura con la chiave POOL del database:
+
+    "POOL": {"MAX_SIZE": 10, "TIMEOUT": 10, "MAX_IDLE": 300, "SLOW_WAIT": 0.1}
+
+Pensato per il percorso ASGI, dove le connessioni persistenti per thread
+(CONN_MAX_AGE) non vengono riutilizzate in modo affidabile: Django "chiude" la
+connessione a fine richiesta e questa torna nel pool invece di essere chiusa.
+"""
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.base import IsolationLevel
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        # il backend imposta isolation_level solo quando apre una connessione
+        # nuova: per quelle riusate dal pool lo imposto qui
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = IsolationLevel(
+            options.get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return self.pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
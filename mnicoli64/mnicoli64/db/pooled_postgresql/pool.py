@@ -0,0 +1,185 @@
+import collections
+import logging
+import threading
+import time
+
+from django.db.utils import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(OperationalError):
+    """Nessuna connessione libera nel pool entro il timeout"""
+
+
+class ConnectionPool:
+    """
+    Pool di connessioni thread-safe con dimensione massima: se tutte le
+    connessioni sono in uso il chiamante attende (fino a `timeout` secondi)
+    che una venga restituita. Tiene traccia di attese e timeout per poter
+    dimensionare il pool sotto carico (vedi stats()).
+
+    Le connessioni inattive vengono verificate prima di essere riconsegnate
+    (stato della transazione e `SELECT 1`): quelle cadute lato server, ad
+    esempio per un riavvio o un timeout del pooler, vengono scartate e al
+    loro posto se ne apre una nuova.
+    """
+
+    def __init__(self, max_size=10, timeout=10.0, max_idle=300.0, slow_wait=0.1):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.slow_wait = slow_wait
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = collections.deque()  # (connessione, istante di rilascio)
+
+        self._in_use = 0
+        self._waiting = 0
+        self._counters = collections.Counter()
+        self._wait_max = 0.0
+
+    def acquire(self, connect):
+        """Connessione libera dal pool, o una nuova aperta con `connect()`"""
+        start = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        waited = time.monotonic() - start
+
+        with self._lock:
+            self._counters['requests'] += 1
+            self._counters['wait_seconds'] += waited
+            self._wait_max = max(self._wait_max, waited)
+            if not acquired:
+                self._counters['timeouts'] += 1
+            elif waited >= self.slow_wait:
+                self._counters['slow_waits'] += 1
+
+        if not acquired:
+            raise PoolTimeout(
+                f"Nessuna connessione disponibile nel pool dopo {self.timeout}s "
+                f"(max_size={self.max_size})"
+            )
+        if waited >= self.slow_wait:
+            logger.warning("Attesa di %.3fs per una connessione dal pool", waited)
+
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = connect()
+                with self._lock:
+                    self._counters['connections_opened'] += 1
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def _take_idle(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, released_at = self._idle.pop()
+            if conn.closed or now - released_at > self.max_idle:
+                self._discard(conn)
+                continue
+            if not self._is_healthy(conn):
+                with self._lock:
+                    self._counters['health_check_failures'] += 1
+                logger.warning("Connessione inattiva non più valida, scartata dal pool")
+                self._discard(conn)
+                continue
+            return conn
+
+    def _is_healthy(self, conn):
+        """Verifica una connessione inattiva con una query di prova"""
+        try:
+            if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                return False
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not conn.autocommit:
+                conn.rollback()
+        except Exception:
+            return False
+        return True
+
+    def release(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            try:
+                # nessuna transazione lasciata aperta torna nel pool
+                conn.rollback()
+            except Exception:
+                self._discard(conn)
+                return
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._counters['connections_discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        """Istantanea dei contatori del pool (per log e metriche)"""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'requests': self._counters['requests'],
+                'wait_seconds_total': round(self._counters['wait_seconds'], 6),
+                'wait_seconds_max': round(self._wait_max, 6),
+                'slow_waits': self._counters['slow_waits'],
+                'timeouts': self._counters['timeouts'],
+                'connections_opened': self._counters['connections_opened'],
+                'connections_discarded': self._counters['connections_discarded'],
+                'health_check_failures': self._counters['health_check_failures'],
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """Pool (uno per alias di database e per processo), creato al primo uso"""
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                max_size=int(options.get('MAX_SIZE', 10)),
+                timeout=float(options.get('TIMEOUT', 10)),
+                max_idle=float(options.get('MAX_IDLE', 300)),
+                slow_wait=float(options.get('SLOW_WAIT', 0.1)),
+            )
+        return pool
+
+
+def pool_stats():
+    """Statistiche di tutti i pool attivi nel processo, per alias"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
@@ -10,21 +10,42 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+
+def env_bool(name, default=False):
+    """Legge una variabile d'ambiente booleana (1/true/yes/on)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_list(name, default=""):
+    """Legge una lista separata da virgole da una variabile d'ambiente"""
+    return [item.strip() for item in os.environ.get(name, default).split(",") if item.strip()]
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-buzq=p1itbrq=+5fo4o9=($+me&cf@kwf$jkqdcy$r=&st$=hi"
+SECRET_KEY = os.environ.get(
+    "DJANGO_SECRET_KEY",
+    "django-insecure-buzq=p1itbrq=+5fo4o9=($+me&cf@kwf$jkqdcy$r=&st$=hi",
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Disattivato se la variabile manca: DJANGO_DEBUG=1 solo in sviluppo
+# (docker-compose, runserver locale)
+DEBUG = env_bool("DJANGO_DEBUG", False)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env_list("DJANGO_ALLOWED_HOSTS")
+CSRF_TRUSTED_ORIGINS = env_list("DJANGO_CSRF_TRUSTED_ORIGINS")
 
 
 # Application definition
@@ -43,6 +64,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # file statici serviti dal server applicativo anche con DEBUG=False
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # gzip/Brotli delle risposte dinamiche (i file statici sono già compressi
+    # da collectstatic e serviti da WhiteNoise prima di arrivare qui)
+    "sistema_gestione_veicoli.middleware.CompressionMiddleware",
+    # metriche Prometheus esposte su /metrics
+    "sistema_gestione_veicoli.middleware.MetricsMiddleware",
+    # query/tempo DB per richiesta (dopo WhiteNoise: i file statici non vengono misurati)
+    "sistema_gestione_veicoli.middleware.QueryTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -76,14 +106,33 @@ WSGI_APPLICATION = "mnicoli64.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Ogni parametro può essere sovrascritto da variabili d'ambiente DB_*
+#
+# Connessioni: di default sono persistenti (DB_CONN_MAX_AGE secondi) con health
+# check all'inizio di ogni richiesta, per non pagare TCP+TLS+auth ogni volta.
+# Con DB_POOL=1 si usa invece il pool in-process (mnicoli64/db/pooled_postgresql),
+# consigliato con i worker ASGI: la connessione torna nel pool a fine richiesta.
+DB_POOL = env_bool("DB_POOL", False)
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": "postgres",
-        "USER": "postgres.yyxzfqayxiikecmopqjh",
-        "PASSWORD": "6$QImnJl079=",
-        "HOST": "aws-0-us-east-2.pooler.supabase.com",
-        "PORT": "5432",
+        "ENGINE": (
+            "mnicoli64.db.pooled_postgresql" if DB_POOL
+            else os.environ.get("DB_ENGINE", "django.db.backends.postgresql")
+        ),
+        "NAME": os.environ.get("DB_NAME", "postgres"),
+        "USER": os.environ.get("DB_USER", "postgres.yyxzfqayxiikecmopqjh"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", "6$QImnJl079="),
+        "HOST": os.environ.get("DB_HOST", "aws-0-us-east-2.pooler.supabase.com"),
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": env_bool("DB_CONN_HEALTH_CHECKS", True),
+        "POOL": {
+            "MAX_SIZE": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            "MAX_IDLE": float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+            "SLOW_WAIT": float(os.environ.get("DB_POOL_SLOW_WAIT", "0.1")),
+        },
     }
 }
 
@@ -128,9 +177,91 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# collectstatic genera nomi con hash del contenuto e varianti .gz/.br;
+# WhiteNoise serve i file con hash con Cache-Control max-age di 10 anni, immutable
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Cache: locmem per processo di default. Con più worker Gunicorn usare un
+# backend condiviso (es. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# e CACHE_LOCATION=/tmp/django_cache), altrimenti l'invalidazione delle risposte
+# in cache vale solo per il worker che ha eseguito la scrittura
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
+# Cache delle risposte delle API tabellari (sistema_gestione_veicoli/table_cache.py):
+# invalidata dalle scritture tramite versioni per tabella; il TTL è solo un limite
+# superiore. 0 disattiva la cache
+TABLE_CACHE_TTL = int(os.environ.get("TABLE_CACHE_TTL", "300"))
+
+# Richieste identiche concorrenti sulle API tabellari (stessa tabella, filtri,
+# ordinamento e pagina) condividono una sola query: nel worker e, con una cache
+# condivisa, tra worker tramite un lock (LOCK_TIMEOUT). In entrambi i casi la
+# risposta condivisa si attende al più WAIT secondi, poi si esegue la query
+TABLE_SINGLE_FLIGHT = {
+    "ENABLED": env_bool("TABLE_SINGLE_FLIGHT", True),
+    "LOCK_TIMEOUT": 30,
+    "WAIT": float(os.environ.get("TABLE_SINGLE_FLIGHT_WAIT", "10")),
+    "POLL_INTERVAL": 0.05,
+}
+
+# Statistiche della dashboard (sistema_gestione_veicoli/stats.py)
+# TTL della cache in secondi; in modalità approssimata su Postgres i conteggi
+# vengono stimati dalle statistiche del planner invece che con COUNT(*)
+DASHBOARD_STATS_TTL = 60
+DASHBOARD_STATS_APPROXIMATE = False
+
+# Ricerca testuale nei filtri (sistema_gestione_veicoli/search.py):
+# 'auto' usa gli indici trigram su Postgres e la ricerca per prefisso altrove;
+# valori espliciti: 'trigram' (sottostringa), 'prefix'
+TEXT_SEARCH_BACKEND = "auto"
+
+# Compressione delle risposte (sistema_gestione_veicoli/middleware.py)
+RESPONSE_COMPRESSION = {
+    "MIN_SIZE": int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")),
+    "CONTENT_TYPES": [
+        "application/json",
+        "application/x-ndjson",
+        "text/csv",
+        "text/html",
+        "text/plain",
+    ],
+    "BROTLI_QUALITY": int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4")),
+}
+
+# Serializzazione JSON delle API (sistema_gestione_veicoli/serialization.py):
+# 'auto' usa orjson se installato, altrimenti il modulo json standard
+JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", "auto")
+
+# Strumentazione per richiesta (sistema_gestione_veicoli/middleware.py):
+# in produzione ridurre QUERY_TIMING_SAMPLE_RATE (es. 0.1)
+QUERY_TIMING = {
+    "SAMPLE_RATE": float(os.environ.get("QUERY_TIMING_SAMPLE_RATE", "1.0")),
+    "MAX_QUERIES": int(os.environ.get("QUERY_TIMING_MAX_QUERIES", "20")),
+    "SLOW_DB_MS": float(os.environ.get("QUERY_TIMING_SLOW_DB_MS", "200")),
+    "SLOW_TOTAL_MS": float(os.environ.get("QUERY_TIMING_SLOW_TOTAL_MS", "1000")),
+    "HEADER": env_bool("QUERY_TIMING_HEADER", True),
+}
+
+# Accesso all'endpoint Prometheus /metrics: consentito agli IP in
+# METRICS_ALLOWED_IPS (REMOTE_ADDR, quindi il proxy se ce n'è uno davanti) o
+# con l'header "Authorization: Bearer <METRICS_TOKEN>"; token vuoto = disattivato
+METRICS_ALLOWED_IPS = env_list("METRICS_ALLOWED_IPS", "127.0.0.1,::1")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 # Crispy Forms Configuration
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -150,7 +281,7 @@ LOGGING = {
     },
     'root': {
         'handlers': ['console'],
-        'level': 'DEBUG',  # Mostra tutti i messaggi di livello DEBUG o superiore
+        'level': os.environ.get('DJANGO_LOG_LEVEL', 'DEBUG'),  # DEBUG: mostra tutti i messaggi
     },
     'loggers': {
         'django': {
@@ -161,7 +292,7 @@ LOGGING = {
         # ← Il tuo modulo (opzionale)
         'sistema_gestione_veicoli': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': os.environ.get('DJANGO_LOG_LEVEL', 'DEBUG'),
             'propagate': False,
         },
     },
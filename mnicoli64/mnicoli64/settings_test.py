@@ -0,0 +1,34 @@
+"""
+Impostazioni per i test: SQLite in memoria, nessun accesso al database Supabase.
+
+    python manage.py test --settings=mnicoli64.settings_test
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import LOGGING
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# il manifest dei file statici esiste solo dopo collectstatic
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# una riga di log per richiesta renderebbe illeggibile l'output dei test
+LOGGING["loggers"]["sistema_gestione_veicoli"]["level"] = "WARNING"
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class SistemaGestioneVeicoliConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "sistema_gestione_veicoli"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,216 @@
+import csv
+import io
+import json
+from datetime import date
+
+from django.db import DatabaseError, connection, transaction
+
+from .models import Veicolo
+from .stats import invalidate_dashboard_stats
+from .table_cache import invalidate_tables
+
+IMPORT_FIELDS = ['telaio', 'marca', 'modello', 'dataProd']
+IMPORT_BATCH_SIZE = 5000
+IMPORT_MODES = ('skip', 'update')
+
+MAX_LENGTHS = {
+    name: Veicolo._meta.get_field(name).max_length
+    for name in ('telaio', 'marca', 'modello')
+}
+
+
+class ImportFormatError(ValueError):
+    """File di import non leggibile (formato o intestazioni errati)"""
+
+
+def read_rows(stream, fmt):
+    """Legge le righe (dict) da un file CSV o JSON (lista di oggetti)"""
+    if fmt == 'json':
+        try:
+            rows = json.load(stream)
+        except ValueError:
+            raise ImportFormatError('JSON non valido')
+        if not isinstance(rows, list):
+            raise ImportFormatError('Il JSON deve essere una lista di veicoli')
+        return iter(rows)
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        missing = set(IMPORT_FIELDS) - set(reader.fieldnames or [])
+        if missing:
+            raise ImportFormatError(f"Colonne mancanti: {', '.join(sorted(missing))}")
+        return reader
+    raise ImportFormatError('Formato non valido')
+
+
+def validate_row(row):
+    """Restituisce (tupla pulita, None) oppure (None, messaggio di errore)"""
+    if not isinstance(row, dict):
+        return None, 'Riga non valida'
+
+    values = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ''
+        if not value:
+            return None, f'Campo {field} obbligatorio'
+        if field in MAX_LENGTHS and len(value) > MAX_LENGTHS[field]:
+            return None, f'Campo {field} troppo lungo (max {MAX_LENGTHS[field]})'
+        values[field] = value
+
+    try:
+        values['dataProd'] = date.fromisoformat(values['dataProd'])
+    except ValueError:
+        return None, 'Campo dataProd non valido (formato AAAA-MM-GG)'
+
+    return tuple(values[f] for f in IMPORT_FIELDS), None
+
+
+def _copy_into_staging(cursor, batch):
+    """COPY del batch nella tabella temporanea (psycopg2 o psycopg 3)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for telaio, marca, modello, data_prod in batch:
+        writer.writerow([telaio, marca, modello, data_prod.isoformat()])
+    buffer.seek(0)
+
+    sql = 'COPY veicolo_import_staging (telaio, marca, modello, "dataProd") FROM STDIN WITH (FORMAT csv)'
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, buffer)
+    else:
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _load_postgres(batch, mode):
+    """Staging + COPY + INSERT ... ON CONFLICT; restituisce {telaio: 'inserted'|'updated'}"""
+    table = connection.ops.quote_name(Veicolo._meta.db_table)
+    if mode == 'update':
+        conflict = (
+            'DO UPDATE SET marca = EXCLUDED.marca, modello = EXCLUDED.modello, '
+            '"dataProd" = EXCLUDED."dataProd"'
+        )
+    else:
+        conflict = 'DO NOTHING'
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS veicolo_import_staging '
+            f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'
+        )
+        # dentro una transazione esterna (ATOMIC_REQUESTS, atomic del chiamante)
+        # ogni blocco è un savepoint e ON COMMIT DROP non scatta: la tabella
+        # conserverebbe le righe dei blocchi precedenti
+        cursor.execute('TRUNCATE veicolo_import_staging')
+        _copy_into_staging(cursor, batch)
+        # xmax = 0 solo per le righe appena inserite (non per quelle aggiornate)
+        cursor.execute(
+            f'INSERT INTO {table} (telaio, marca, modello, "dataProd") '
+            f'SELECT telaio, marca, modello, "dataProd" FROM veicolo_import_staging '
+            f'ON CONFLICT (telaio) {conflict} '
+            f'RETURNING telaio, (xmax = 0)'
+        )
+        return {
+            telaio: 'inserted' if inserted else 'updated'
+            for telaio, inserted in cursor.fetchall()
+        }
+
+
+def _load_orm(batch, mode):
+    """Fallback per backend diversi da Postgres: bulk_create"""
+    telai = [row[0] for row in batch]
+    esistenti = set(Veicolo.objects.filter(telaio__in=telai).values_list('telaio', flat=True))
+    objs = [
+        Veicolo(telaio=telaio, marca=marca, modello=modello, dataProd=data_prod)
+        for telaio, marca, modello, data_prod in batch
+        if mode == 'update' or telaio not in esistenti
+    ]
+    if mode == 'update':
+        Veicolo.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=['telaio'],
+            update_fields=['marca', 'modello', 'dataProd'],
+        )
+    else:
+        Veicolo.objects.bulk_create(objs)
+    return {
+        obj.telaio: 'updated' if obj.telaio in esistenti else 'inserted'
+        for obj in objs
+    }
+
+
+def _load_batch(batch, mode):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            return _load_postgres(batch, mode)
+        return _load_orm(batch, mode)
+
+
+def import_veicoli(rows, mode='skip', batch_size=IMPORT_BATCH_SIZE):
+    """
+    Importa veicoli a blocchi di `batch_size` righe. Con mode='skip' i telai già
+    presenti vengono segnalati come errore, con mode='update' vengono aggiornati.
+    Ogni blocco è una transazione: un errore di database annulla solo quel blocco,
+    le cui righe finiscono negli errori del report.
+    Restituisce il report con i contatori e gli errori per riga.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f'Modalità non valida: {mode}')
+
+    report = {'total': 0, 'inserted': 0, 'updated': 0, 'errors': []}
+    visti = set()
+    batch, batch_rows = [], []
+
+    def flush():
+        try:
+            result = _load_batch(batch, mode)
+        except DatabaseError as e:
+            # blocco annullato: le sue righe vanno segnalate, i blocchi già
+            # salvati restano e l'import prosegue con il successivo
+            for (telaio, *_), riga in zip(batch, batch_rows):
+                report['errors'].append(
+                    {'row': riga, 'telaio': telaio, 'message': f'Errore di database: {e}'}
+                )
+            batch.clear()
+            batch_rows.clear()
+            return
+        for (telaio, *_), riga in zip(batch, batch_rows):
+            esito = result.get(telaio)
+            if esito is None:
+                report['errors'].append(
+                    {'row': riga, 'telaio': telaio, 'message': 'Numero di telaio già esistente'}
+                )
+            else:
+                report[esito] += 1
+        batch.clear()
+        batch_rows.clear()
+
+    try:
+        # riga 1 = primo record (l'intestazione CSV non viene contata)
+        for numero_riga, row in enumerate(rows, start=1):
+            report['total'] += 1
+            values, error = validate_row(row)
+            if error is None and values[0] in visti:
+                error = 'Numero di telaio duplicato nel file'
+            if error:
+                telaio = row.get('telaio') if isinstance(row, dict) else None
+                report['errors'].append({'row': numero_riga, 'telaio': telaio, 'message': error})
+                continue
+
+            visti.add(values[0])
+            batch.append(values)
+            batch_rows.append(numero_riga)
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+    finally:
+        # bulk_create/COPY non inviano post_save: invalido a mano statistiche e
+        # cache, anche se l'import si interrompe dopo aver salvato qualche blocco;
+        # come per le tabelle, al commit (l'import può essere in un atomic esterno)
+        if report['inserted'] or report['updated']:
+            transaction.on_commit(invalidate_dashboard_stats)
+            invalidate_tables(Veicolo)
+    return report
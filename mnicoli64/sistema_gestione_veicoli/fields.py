@@ -0,0 +1,28 @@
+"""
+Risoluzione dei percorsi ORM (es. 'targa__dataEm') nei campi del modello,
+condivisa da filtri (tables.py) e validazione dei cursori (pagination.py).
+"""
+
+
+def resolve_field(model, path):
+    """
+    Campo finale di `path` (es. 'targa__dataEm') e, se il filtro è su una chiave,
+    la colonna locale che la contiene: la pk stessa o l'attname della FK
+    ('targa__numero' -> 'targa_id', senza join). FieldDoesNotExist se il campo manca.
+    """
+    parts = path.split('__')
+    first = model._meta.get_field(parts[0])
+    field, opts = None, model._meta
+    for part in parts:
+        field = opts.get_field(part)
+        if field.is_relation:
+            opts = field.related_model._meta
+    if field.is_relation:
+        field = field.target_field
+
+    key_path = None
+    if len(parts) == 1:
+        key_path = first.attname if (first.primary_key or first.is_relation) else None
+    elif len(parts) == 2 and first.is_relation and field == first.target_field:
+        key_path = first.attname
+    return field, key_path
@@ -0,0 +1,197 @@
+import json
+import logging
+import platform
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from sistema_gestione_veicoli import urls
+from sistema_gestione_veicoli.middleware import QueryCollector
+from sistema_gestione_veicoli.models import (
+    Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita,
+)
+from sistema_gestione_veicoli.tables import TABLES
+
+
+def build_cases(telaio):
+    """
+    Casi di benchmark: (nome, url_name, metodo, kwargs dell'URL, parametri/dati,
+    scrittura). I casi di scrittura vengono eseguiti in una transazione annullata.
+    """
+    veicolo = {'telaio': telaio}
+    cases = [
+        ('dashboard', 'dashboard', 'GET', {}, {}, False),
+        ('veicoli_list', 'veicoli_list', 'GET', {}, {}, False),
+        ('veicoli_list_sort', 'veicoli_list', 'GET', {}, {'sort': 'marca', 'order': 'desc'}, False),
+        ('veicoli_add', 'veicoli_add', 'GET', {}, {}, False),
+        ('veicolo_detail', 'veicolo_detail', 'GET', {'pk': telaio}, {}, False),
+        ('veicolo_edit', 'veicolo_edit', 'GET', {'pk': telaio}, {}, False),
+        ('veicolo_delete', 'veicolo_delete', 'GET', {'pk': telaio}, {}, False),
+        ('veicoli_api', 'veicoli_api', 'GET', {}, {}, False),
+        ('veicoli_api_filter', 'veicoli_api', 'GET', {}, {'marca': 'fia', 'sort': 'dataProd'}, False),
+        ('add_veicolo_api', 'add_veicolo_api', 'POST', {}, {
+            'telaio': 'BENCH000000000001', 'marca': 'Fiat', 'modello': 'Panda',
+            'dataProd': '2020-01-01',
+        }, True),
+        ('import_veicoli_api', 'import_veicoli_api', 'POST', {}, {
+            'body': json.dumps([
+                {'telaio': f'BENCH{i:012d}', 'marca': 'Fiat', 'modello': 'Panda',
+                 'dataProd': '2020-01-01'}
+                for i in range(1000)
+            ]),
+            'content_type': 'application/json',
+        }, True),
+        ('get_veicolo_api', 'get_veicolo_api', 'GET', veicolo, {}, False),
+        ('update_veicolo_api', 'update_veicolo_api', 'POST', veicolo, {'marca': 'Bench'}, True),
+        ('delete_veicolo_api', 'delete_veicolo_api', 'POST', veicolo, {}, True),
+        ('targhe_list', 'targhe_list', 'GET', {}, {}, False),
+        ('targhe_api', 'targhe_api', 'GET', {}, {}, False),
+        ('targhe_api_stato', 'targhe_api', 'GET', {}, {'stato': 'Attiva'}, False),
+        ('revisioni_list', 'revisioni_list', 'GET', {}, {}, False),
+        ('targhe_attive_list', 'targhe_attive_list', 'GET', {}, {}, False),
+        ('targhe_restituite_list', 'targhe_restituite_list', 'GET', {}, {}, False),
+        ('metrics', 'metrics', 'GET', {}, {}, False),
+        ('api_table_export_veicolo', 'api-table-export', 'GET', {}, {'table': 'veicolo'}, False),
+    ]
+    for table in TABLES:
+        cases.append((f'api_table_{table}', 'api-table', 'GET', {}, {'table': table}, False))
+        cases.append((f'api_table_facets_{table}', 'api-table-facets', 'GET', {}, {'table': table}, False))
+    cases.append((
+        'api_table_revisione_filter', 'api-table', 'GET', {},
+        {'table': 'revisione', 'esito': 'negativo', 'sort': 'dataRev', 'order': 'desc'}, False,
+    ))
+    return cases
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        'min': round(values[0], 2),
+        'median': round(statistics.median(values), 2),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+        'max': round(values[-1], 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Misura i tempi di risposta di tutti gli endpoint di urls.py (prima "
+        "richiesta a freddo e N richieste a caldo) e scrive i risultati in JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--runs', type=int, default=10, help="Richieste a caldo per caso")
+        parser.add_argument('--label', default='', help="Etichetta del run (es. versione)")
+        parser.add_argument('--only', nargs='*', default=None, help="Esegue solo questi casi")
+        parser.add_argument('--skip', nargs='*', default=[], help="Casi da saltare")
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs deve essere almeno 1")
+
+        telaio = (
+            TargaAttiva.objects.order_by('veicolo_id').values_list('veicolo_id', flat=True).first()
+            or Veicolo.objects.order_by('telaio').values_list('telaio', flat=True).first()
+        )
+        if telaio is None:
+            raise CommandError("Nessun veicolo presente: eseguire prima genera_dati_flotta")
+
+        cases = build_cases(telaio)
+        covered = {case[1] for case in cases}
+        missing = [p.name for p in urls.urlpatterns if p.name and p.name not in covered]
+        if missing:
+            raise CommandError(f"Endpoint senza caso di benchmark: {', '.join(missing)}")
+
+        if options['only'] is not None:
+            cases = [c for c in cases if c[0] in options['only']]
+        cases = [c for c in cases if c[0] not in options['skip']]
+
+        # una riga di log per richiesta falserebbe i tempi
+        logging.getLogger('sistema_gestione_veicoli.timing').setLevel(logging.WARNING)
+
+        client = Client(raise_request_exception=False)
+        results = {}
+        # il client di test usa l'host 'testserver'
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for case in cases:
+                results[case[0]] = self.run_case(client, case, options['runs'])
+                r = results[case[0]]
+                self.stdout.write(
+                    f"{case[0]:32} {r['status']:>3}  cold {r['cold_ms']:>9.2f} ms  "
+                    f"warm median {r['warm_ms']['median']:>9.2f} ms  queries {r['queries']}"
+                )
+
+        report = {
+            'meta': {
+                'label': options['label'],
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'runs': options['runs'],
+                'rows': {
+                    model._meta.db_table: model.objects.count()
+                    for model in (Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita)
+                },
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Risultati scritti in {options['output']}"))
+
+    def run_case(self, client, case, runs):
+        name, url_name, method, kwargs, data, writes = case
+        url = reverse(url_name, kwargs=kwargs)
+
+        # a freddo: cache applicativa vuota e connessione al database nuova
+        # (la cache del database stesso non viene svuotata)
+        cache.clear()
+        connections.close_all()
+        status, cold, queries = self.request(client, method, url, data, writes)
+
+        warm = [self.request(client, method, url, data, writes)[1] for _ in range(runs)]
+        return {
+            'url': url,
+            'method': method,
+            'params': {k: v for k, v in data.items() if k != 'body'},
+            'status': status,
+            'cold_ms': round(cold, 2),
+            'warm_ms': summary(warm),
+            'queries': queries,
+        }
+
+    def request(self, client, method, url, data, writes):
+        collector = QueryCollector()
+        with ExitStack() as stack:
+            if writes:
+                stack.enter_context(transaction.atomic())
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(collector))
+
+            start = time.perf_counter()
+            if method == 'GET':
+                response = client.get(url, data)
+            elif 'body' in data:
+                response = client.post(url, data['body'], content_type=data['content_type'])
+            else:
+                response = client.post(url, data)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = (time.perf_counter() - start) * 1000
+
+            if writes:
+                # le scritture non devono alterare i dati tra un run e l'altro
+                transaction.set_rollback(True)
+        return response.status_code, elapsed, collector.count
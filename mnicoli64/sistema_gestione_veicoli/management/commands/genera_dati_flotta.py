@@ -0,0 +1,193 @@
+import random
+import string
+import time
+from datetime import date, timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from sistema_gestione_veicoli.models import (
+    Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita,
+)
+from sistema_gestione_veicoli.stats import invalidate_dashboard_stats
+from sistema_gestione_veicoli.table_cache import invalidate_table_names
+from sistema_gestione_veicoli.tables import TABLES
+
+MARCHE = {
+    'Fiat': ['Panda', '500', 'Tipo', 'Punto', 'Doblò'],
+    'Volkswagen': ['Golf', 'Polo', 'Passat', 'T-Roc', 'Tiguan'],
+    'Renault': ['Clio', 'Captur', 'Megane', 'Kangoo'],
+    'Toyota': ['Yaris', 'Corolla', 'C-HR', 'RAV4'],
+    'Ford': ['Fiesta', 'Focus', 'Puma', 'Transit'],
+    'Peugeot': ['208', '2008', '308', '3008'],
+    'Lancia': ['Ypsilon'],
+    'Alfa Romeo': ['Giulietta', 'Giulia', 'Stelvio', 'Tonale'],
+}
+
+MOTIVAZIONI = [
+    'Freni non efficienti',
+    'Emissioni oltre i limiti',
+    'Pneumatici usurati',
+    'Luci non funzionanti',
+    'Sospensioni danneggiate',
+    'Corrosione del telaio',
+]
+
+# quota di veicoli con targa attiva / con una targa restituita
+QUOTA_ATTIVE = 0.8
+QUOTA_RESTITUITE = 0.3
+
+LETTERE = [c for c in string.ascii_uppercase if c not in 'IOQU']
+
+
+def numero_targa(i):
+    """Targa in formato italiano AA000AA, univoca e deterministica per indice"""
+    n = len(LETTERE)
+    cifre = i % 1000
+    i //= 1000
+    lettere = []
+    for _ in range(4):
+        lettere.append(LETTERE[i % n])
+        i //= n
+    return f"{lettere[3]}{lettere[2]}{cifre:03d}{lettere[1]}{lettere[0]}"
+
+
+def numero_telaio(i):
+    return f"ZFA{i:014d}"
+
+
+def data_casuale(rng, inizio, fine):
+    return inizio + timedelta(days=rng.randrange((fine - inizio).days + 1))
+
+
+def a_blocchi(iterabile, dimensione):
+    blocco = []
+    for elemento in iterabile:
+        blocco.append(elemento)
+        if len(blocco) >= dimensione:
+            yield blocco
+            blocco = []
+    if blocco:
+        yield blocco
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera dati sintetici di una flotta (veicoli, targhe attive/restituite, "
+        "revisioni) con inserimenti bulk, per benchmark e test di carico"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--veicoli', type=int, default=1_000_000)
+        parser.add_argument('--targhe', type=int, default=1_500_000)
+        parser.add_argument('--revisioni', type=int, default=5_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help="Svuota le tabelle prima di generare i dati",
+        )
+
+    def handle(self, *args, **options):
+        n_veicoli = options['veicoli']
+        n_targhe = options['targhe']
+        n_revisioni = options['revisioni']
+        self.batch_size = options['batch_size']
+        rng = random.Random(options['seed'])
+
+        # layout deterministico: il veicolo i ha la targa attiva i; il veicolo k
+        # ha restituito la targa n_attive + k; le altre targhe sono libere
+        n_attive = min(int(n_veicoli * QUOTA_ATTIVE), n_targhe)
+        n_restituite = max(0, min(int(n_veicoli * QUOTA_RESTITUITE), n_targhe - n_attive))
+        n_assegnate = n_attive + n_restituite
+        if n_revisioni and not n_assegnate:
+            raise CommandError("Servono targhe assegnate per generare revisioni")
+
+        if options['flush']:
+            self.flush()
+        elif Veicolo.objects.exists() or Targa.objects.exists():
+            raise CommandError("Il database contiene già dati: usare --flush")
+
+        oggi = date.today()
+
+        def stato(i):
+            if i < n_attive:
+                return Targa.STATO_ATTIVA
+            if i < n_assegnate:
+                return Targa.STATO_RESTITUITA
+            return Targa.STATO_NON_ASSEGNATA
+
+        marche = list(MARCHE)
+        self.bulk('veicoli', Veicolo, n_veicoli, (
+            Veicolo(
+                telaio=numero_telaio(i),
+                marca=(marca := rng.choice(marche)),
+                modello=rng.choice(MARCHE[marca]),
+                dataProd=data_casuale(rng, date(2000, 1, 1), oggi),
+            )
+            for i in range(n_veicoli)
+        ))
+        self.bulk('targhe', Targa, n_targhe, (
+            Targa(
+                numero=numero_targa(i),
+                dataEm=data_casuale(rng, date(2000, 1, 1), oggi),
+                stato=stato(i),
+            )
+            for i in range(n_targhe)
+        ))
+        self.bulk('targhe attive', TargaAttiva, n_attive, (
+            TargaAttiva(targa_id=numero_targa(i), veicolo_id=numero_telaio(i))
+            for i in range(n_attive)
+        ))
+        self.bulk('targhe restituite', TargaRestituita, n_restituite, (
+            TargaRestituita(
+                targa_id=numero_targa(n_attive + k),
+                veicolo_id=numero_telaio(k),
+                dataRes=data_casuale(rng, date(2010, 1, 1), oggi),
+            )
+            for k in range(n_restituite)
+        ))
+
+        def revisione():
+            positivo = rng.random() < 0.8
+            return Revisione(
+                targa_id=numero_targa(rng.randrange(n_assegnate)),
+                dataRev=data_casuale(rng, date(2005, 1, 1), oggi),
+                esito='positivo' if positivo else 'negativo',
+                motivazione=None if positivo else rng.choice(MOTIVAZIONI),
+            )
+
+        self.bulk('revisioni', Revisione, n_revisioni, (revisione() for _ in range(n_revisioni)))
+
+        # stato è già calcolato sopra: una sola verifica/correzione alla fine
+        call_command('rebuild_stato_targhe', stdout=self.stdout)
+        invalidate_dashboard_stats()
+        invalidate_table_names(*TABLES)
+        if connection.vendor == 'postgresql':
+            # statistiche aggiornate per il planner (e per le stime della dashboard)
+            with connection.cursor() as cursor:
+                for model in (Veicolo, Targa, TargaAttiva, TargaRestituita, Revisione):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        self.stdout.write(self.style.SUCCESS("Dati sintetici generati"))
+
+    def bulk(self, label, model, total, objs):
+        start = time.perf_counter()
+        done = 0
+        for blocco in a_blocchi(objs, self.batch_size):
+            # _base_manager: il queryset di TargaAttiva/TargaRestituita
+            # ricalcolerebbe lo stato delle targhe a ogni blocco
+            with transaction.atomic():
+                model._base_manager.bulk_create(blocco)
+            done += len(blocco)
+            self.stdout.write(f"\r{label}: {done}/{total}", ending='')
+            self.stdout.flush()
+        self.stdout.write(f"\r{label}: {done}/{total} in {time.perf_counter() - start:.1f}s")
+
+    def flush(self):
+        """Svuota le tabelle senza passare dai segnali (un DELETE per tabella)"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in (Revisione, TargaAttiva, TargaRestituita, Targa, Veicolo):
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sistema_gestione_veicoli.bulk_import import (
+    IMPORT_BATCH_SIZE, IMPORT_MODES, ImportFormatError, import_veicoli, read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = "Import massivo di veicoli da file CSV o JSON (telaio, marca, modello, dataProd)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File CSV o JSON da importare")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            help="Formato del file (di default dedotto dall'estensione)",
+        )
+        parser.add_argument(
+            '--mode',
+            choices=IMPORT_MODES,
+            default='skip',
+            help="skip: segnala i telai già presenti; update: li aggiorna",
+        )
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--report',
+            help="Scrive il report completo (con gli errori per riga) in questo file JSON",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = import_veicoli(
+                    read_rows(stream, fmt),
+                    mode=options['mode'],
+                    batch_size=options['batch_size'],
+                )
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as out:
+                json.dump(report, out, ensure_ascii=False, indent=2)
+
+        for error in report['errors'][:20]:
+            self.stderr.write(f"riga {error['row']} ({error['telaio']}): {error['message']}")
+        if len(report['errors']) > 20:
+            self.stderr.write(f"... altri {len(report['errors']) - 20} errori")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['total']} righe lette: {report['inserted']} inseriti, "
+            f"{report['updated']} aggiornati, {len(report['errors'])} errori"
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from sistema_gestione_veicoli.models import Targa
+
+
+class Command(BaseCommand):
+    help = "Verifica e ricostruisce la colonna denormalizzata targa.stato"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Solo verifica: esce con errore se ci sono targhe disallineate",
+        )
+
+    def handle(self, *args, **options):
+        disallineate = (
+            Targa.objects
+            .with_stato_calcolato()
+            .exclude(stato=F('stato_calcolato'))
+        )
+        count = disallineate.count()
+
+        if options['check']:
+            if count:
+                raise CommandError(f"{count} targhe con stato disallineato")
+            self.stdout.write(self.style.SUCCESS("Stato delle targhe allineato"))
+            return
+
+        # un solo UPDATE sulle sole righe disallineate
+        updated = Targa.objects.filter(
+            numero__in=disallineate.values('numero')
+        ).refresh_stato()
+        self.stdout.write(self.style.SUCCESS(f"Stato ricalcolato per {updated} targhe"))
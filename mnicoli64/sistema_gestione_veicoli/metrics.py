@@ -0,0 +1,130 @@
+"""
+Metriche Prometheus dell'applicazione.
+
+Con più processi (worker Gunicorn) impostare PROMETHEUS_MULTIPROC_DIR su una
+directory scrivibile e vuota all'avvio: ogni worker scrive i propri valori su
+file memory-mapped e /metrics li aggrega (vedi gunicorn.conf.py).
+
+Le statistiche del pool di connessioni (mnicoli64/db/pooled_postgresql) sono
+lette al momento dello scrape e riguardano solo il processo che risponde: per
+questo portano l'etichetta `pid`.
+"""
+
+import hmac
+import os
+
+from django.conf import settings
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from mnicoli64.db.pooled_postgresql.pool import pool_stats
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Latenza delle richieste HTTP per nome di URL',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+REQUESTS = Counter(
+    'http_requests_total',
+    'Richieste HTTP per nome di URL e codice di stato',
+    ['view', 'method', 'status'],
+)
+
+EXCEPTIONS = Counter(
+    'http_request_exceptions_total',
+    'Eccezioni non gestite sollevate dalle view',
+    ['view'],
+)
+
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Numero di query SQL per richiesta',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+
+DB_DURATION = Histogram(
+    'http_request_db_duration_seconds',
+    'Tempo totale speso sul database per richiesta',
+    ['view'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+TABLE_ROWS = Histogram(
+    'table_api_rows',
+    'Righe restituite da ogni chiamata a table_api',
+    ['table'],
+    buckets=(0, 1, 10, 50, 100, 250, 500, 1000),
+)
+
+# statistiche del pool: (chiave di pool_stats(), nome della metrica, descrizione)
+POOL_GAUGES = (
+    ('max_size', 'db_pool_max_size', 'Dimensione massima del pool'),
+    ('in_use', 'db_pool_connections_in_use', 'Connessioni in uso'),
+    ('idle', 'db_pool_connections_idle', 'Connessioni inattive nel pool'),
+    ('waiting', 'db_pool_waiting', 'Richieste in attesa di una connessione'),
+    ('wait_seconds_max', 'db_pool_wait_seconds_max', 'Attesa massima per una connessione'),
+)
+
+POOL_COUNTERS = (
+    ('requests', 'db_pool_requests', 'Connessioni richieste al pool'),
+    ('wait_seconds_total', 'db_pool_wait_seconds', 'Tempo totale di attesa per una connessione'),
+    ('slow_waits', 'db_pool_slow_waits', 'Attese oltre la soglia SLOW_WAIT'),
+    ('timeouts', 'db_pool_timeouts', 'Richieste scadute senza connessione libera'),
+    ('connections_opened', 'db_pool_connections_opened', 'Connessioni aperte'),
+    ('connections_discarded', 'db_pool_connections_discarded', 'Connessioni scartate'),
+    ('health_check_failures', 'db_pool_health_check_failures',
+     'Connessioni inattive scartate perché non più valide'),
+)
+
+
+class PoolCollector:
+    """Espone pool_stats() come gauge e counter, per alias di database e processo"""
+
+    def collect(self):
+        stats = pool_stats()
+        pid = str(os.getpid())
+        families = [
+            (key, GaugeMetricFamily(name, doc, labels=['alias', 'pid']))
+            for key, name, doc in POOL_GAUGES
+        ] + [
+            (key, CounterMetricFamily(name, doc, labels=['alias', 'pid']))
+            for key, name, doc in POOL_COUNTERS
+        ]
+        for key, family in families:
+            for alias, values in stats.items():
+                family.add_metric([alias, pid], values[key])
+            yield family
+
+
+POOL_COLLECTOR = PoolCollector()
+REGISTRY.register(POOL_COLLECTOR)
+
+
+def metrics_access_allowed(request):
+    """
+    /metrics espone contatori interni e statistiche del pool: solo per gli IP
+    di METRICS_ALLOWED_IPS o con il token METRICS_TOKEN (header Bearer)
+    """
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, provided = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        provided.strip().encode(), token.encode()
+    )
+
+
+def render_metrics():
+    """Testo in formato Prometheus, aggregato fra i processi se in modalità multiprocess"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(POOL_COLLECTOR)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
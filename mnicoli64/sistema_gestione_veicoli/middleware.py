@@ -0,0 +1,310 @@
+import json
+import logging
+import random
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # dipendenza opzionale: senza brotli solo gzip
+    brotli = None
+
+logger = logging.getLogger('sistema_gestione_veicoli.timing')
+
+
+class QueryCollector:
+    """execute_wrapper che conta le query e ne somma la durata"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+@contextmanager
+def request_query_collector(request):
+    """
+    QueryCollector della richiesta, condiviso fra i middleware: il primo lo
+    installa sulle connessioni e lo salva in request.query_collector, i
+    successivi riusano lo stesso invece di aggiungere un altro execute_wrapper.
+    """
+    collector = getattr(request, 'query_collector', None)
+    if collector is not None:
+        yield collector
+        return
+    collector = request.query_collector = QueryCollector()
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(collector))
+        yield collector
+
+
+class QueryTimingMiddleware:
+    """
+    Misura per ogni richiesta (campionata) numero di query, tempo totale sul
+    database, tempo della view e tempo totale. Non dipende da DEBUG: usa
+    connection.execute_wrapper invece di connection.queries.
+
+    - total: dalla chiamata di questo middleware alla risposta, cioè i
+      middleware successivi in MIDDLEWARE (sessione, CSRF, autenticazione...),
+      la view e il rendering del template; non i middleware precedenti
+      (compressione, metriche, WhiteNoise)
+    - view: da process_view (URL risolto, process_request già eseguiti) alla
+      risposta, quindi la view con il rendering del template; None se la
+      richiesta non arriva a una view (es. 404 o redirect di CommonMiddleware)
+
+    I risultati finiscono in un header Server-Timing, in una riga di log JSON
+    e in request.query_timing. Le richieste oltre le soglie vengono loggate
+    come WARNING.
+
+    Impostazioni (settings.QUERY_TIMING):
+        SAMPLE_RATE   frazione di richieste misurate (0..1)
+        MAX_QUERIES   soglia sul numero di query
+        SLOW_DB_MS    soglia sul tempo totale di database
+        SLOW_TOTAL_MS soglia sul tempo totale (vedi sopra)
+        HEADER        se aggiungere l'header Server-Timing
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'QUERY_TIMING', {})
+        self.sample_rate = float(config.get('SAMPLE_RATE', 1.0))
+        self.max_queries = config.get('MAX_QUERIES', 20)
+        self.slow_db_ms = config.get('SLOW_DB_MS', 200)
+        self.slow_total_ms = config.get('SLOW_TOTAL_MS', 1000)
+        self.header = config.get('HEADER', True)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+        request._timing_sampled = True
+
+        with request_query_collector(request) as collector:
+            # il collector può essere già attivo (MetricsMiddleware): conta
+            # solo le query eseguite da qui in avanti
+            queries_before, duration_before = collector.count, collector.duration
+            start = time.perf_counter()
+            response = self.get_response(request)
+            end = time.perf_counter()
+        total = end - start
+        view_start = getattr(request, '_timing_view_start', None)
+        queries = collector.count - queries_before
+        db_duration = collector.duration - duration_before
+
+        # per le risposte in streaming le query eseguite durante l'invio del
+        # corpo non sono incluse: qui si misura solo fino al primo byte
+        timing = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'queries': queries,
+            'db_ms': round(db_duration * 1000, 2),
+            'view_ms': round((end - view_start) * 1000, 2) if view_start is not None else None,
+            'total_ms': round(total * 1000, 2),
+        }
+
+        reasons = []
+        if self.max_queries is not None and queries > self.max_queries:
+            reasons.append('queries')
+        if self.slow_db_ms is not None and timing['db_ms'] > self.slow_db_ms:
+            reasons.append('db_time')
+        if self.slow_total_ms is not None and timing['total_ms'] > self.slow_total_ms:
+            reasons.append('total_time')
+        timing['flagged'] = reasons
+
+        request.query_timing = timing
+
+        if self.header:
+            entries = [f'db;dur={timing["db_ms"]};desc="{queries} queries"']
+            if timing['view_ms'] is not None:
+                entries.append(f'view;dur={timing["view_ms"]}')
+            entries.append(f'total;dur={timing["total_ms"]}')
+            response['Server-Timing'] = ', '.join(entries)
+
+        level = logging.WARNING if reasons else logging.INFO
+        logger.log(level, json.dumps(timing))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(request, '_timing_sampled', False):
+            request._timing_view_start = time.perf_counter()
+
+
+class MetricsMiddleware:
+    """
+    Alimenta le metriche Prometheus (metrics.py): latenza, richieste per stato,
+    eccezioni e query SQL per richiesta, etichettate con il nome dell'URL.
+    Le query sono contate per tutte le richieste (senza campionamento) con il
+    collector condiviso della richiesta, riusato da QueryTimingMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with request_query_collector(request) as collector:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        # nome dell'URL (es. 'api-table') per non avere una serie per ogni path
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+
+        metrics.REQUEST_LATENCY.labels(view, request.method).observe(duration)
+        metrics.REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+        metrics.DB_QUERIES.labels(view).observe(collector.count)
+        metrics.DB_DURATION.labels(view).observe(collector.duration)
+        return response
+
+    def process_exception(self, request, exception):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        metrics.EXCEPTIONS.labels(view).inc()
+
+
+def accepted_encodings(header):
+    """Codifiche accettate dal client (q > 0) dall'header Accept-Encoding"""
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Comprime le risposte con Brotli (se il pacchetto brotli è installato) o gzip,
+    in base all'Accept-Encoding del client. Solo per i content type in
+    CONTENT_TYPES e, per le risposte non in streaming, sopra MIN_SIZE byte.
+    Le risposte in streaming (export CSV/NDJSON) vengono compresse a blocchi.
+
+    Come GZipMiddleware di Django, gzip aggiunge byte casuali all'header
+    (mitigazione BREACH) e l'ETag diventa debole: If-None-Match continua a
+    funzionare perché il confronto è debole.
+
+    Impostazioni (settings.RESPONSE_COMPRESSION):
+        MIN_SIZE       dimensione minima in byte
+        CONTENT_TYPES  content type comprimibili (senza parametri)
+        BROTLI_QUALITY qualità Brotli (0..11; valori bassi per contenuti dinamici)
+    """
+
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'RESPONSE_COMPRESSION', {})
+        self.min_size = config.get('MIN_SIZE', 1024)
+        self.content_types = set(config.get('CONTENT_TYPES', (
+            'application/json', 'text/html', 'text/csv', 'application/x-ndjson',
+            'text/plain', 'text/css', 'application/javascript', 'text/javascript',
+        )))
+        self.brotli_quality = config.get('BROTLI_QUALITY', 4)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, encoding)
+            # la lunghezza compressa non è nota finché lo stream non è finito
+            del response.headers['Content-Length']
+        else:
+            compressed = self.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(content, quality=self.brotli_quality)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def compress_stream(self, response, encoding):
+        chunks = response.streaming_content
+        if encoding == 'gzip' and not response.is_async:
+            return compress_sequence(chunks, max_random_bytes=self.max_random_bytes)
+
+        if response.is_async:
+            async def compressed():
+                compressor = self._stream_compressor(encoding)
+                async for chunk in chunks:
+                    if data := compressor.process(chunk):
+                        yield data
+                yield compressor.finish()
+        else:
+            def compressed():
+                compressor = self._stream_compressor(encoding)
+                for chunk in chunks:
+                    if data := compressor.process(chunk):
+                        yield data
+                yield compressor.finish()
+        return compressed()
+
+    def _stream_compressor(self, encoding):
+        if encoding == 'br':
+            return brotli.Compressor(quality=self.brotli_quality)
+        return _GzipStream()
+
+
+class _GzipStream:
+    """Compressore gzip incrementale con la stessa interfaccia di brotli.Compressor"""
+
+    def __init__(self):
+        # wbits=31: formato gzip (header e trailer) invece di zlib
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def process(self, chunk):
+        # flush a ogni blocco: il client riceve i dati man mano che arrivano
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
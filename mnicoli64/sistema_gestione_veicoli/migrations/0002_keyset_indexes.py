@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema_gestione_veicoli', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='revisione',
+            index=models.Index(fields=['dataRev', 'numero'], name='revisione_datarev_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revisione',
+            index=models.Index(fields=['esito', 'numero'], name='revisione_esito_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='targa',
+            index=models.Index(fields=['dataEm', 'numero'], name='targa_dataem_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='targarestituita',
+            index=models.Index(fields=['dataRes', 'targa'], name='targarest_datares_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veicolo',
+            index=models.Index(fields=['marca', 'telaio'], name='veicolo_marca_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veicolo',
+            index=models.Index(fields=['modello', 'telaio'], name='veicolo_modello_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veicolo',
+            index=models.Index(fields=['dataProd', 'telaio'], name='veicolo_dataprod_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+def popola_stato(apps, schema_editor):
+    """Calcola lo stato iniziale di tutte le targhe con un solo UPDATE"""
+    Targa = apps.get_model('sistema_gestione_veicoli', 'Targa')
+    TargaAttiva = apps.get_model('sistema_gestione_veicoli', 'TargaAttiva')
+    TargaRestituita = apps.get_model('sistema_gestione_veicoli', 'TargaRestituita')
+    Targa.objects.update(stato=models.Case(
+        models.When(
+            models.Exists(TargaAttiva.objects.filter(targa=models.OuterRef('pk'))),
+            then=models.Value('Attiva'),
+        ),
+        models.When(
+            models.Exists(TargaRestituita.objects.filter(targa=models.OuterRef('pk'))),
+            then=models.Value('Restituita'),
+        ),
+        default=models.Value('Non assegnata'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema_gestione_veicoli', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='targa',
+            name='stato',
+            field=models.CharField(choices=[('Attiva', 'Attiva'), ('Restituita', 'Restituita'), ('Non assegnata', 'Non assegnata')], default='Non assegnata', editable=False, max_length=20, verbose_name='stato'),
+        ),
+        migrations.AddIndex(
+            model_name='targa',
+            index=models.Index(fields=['stato', 'numero'], name='targa_stato_keyset_idx'),
+        ),
+        migrations.RunPython(popola_stato, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# (tabella, colonna) filtrate con __icontains (vedi search.py).
+# Django su Postgres traduce icontains in UPPER("col"::text) LIKE UPPER('%x%'):
+# gli indici GIN trigram sono sulla stessa espressione per poter essere usati.
+TRIGRAM_COLUMNS = [
+    ('veicolo', 'telaio'),
+    ('veicolo', 'marca'),
+    ('veicolo', 'modello'),
+    ('targa', 'numero'),
+    ('revisione', 'targa'),
+    ('revisione', 'motivazione'),
+    ('targa_attiva', 'targa'),
+    ('targa_attiva', 'veicolo'),
+    ('targa_restituita', 'targa'),
+    ('targa_restituita', 'veicolo'),
+]
+
+
+# un CREATE INDEX CONCURRENTLY interrotto lascia un indice non valido, che
+# IF NOT EXISTS salterebbe: va eliminato e ricostruito
+INVALID_INDEX_SQL = """
+    SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.relname = %s AND NOT i.indisvalid
+"""
+
+
+def index_name(table, column):
+    return f'{table}_{column.lower()}_trgm_idx'
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # solo Postgres: su SQLite (test locali) search.py usa il fallback per prefisso
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRIGRAM_COLUMNS:
+        name = index_name(table, column)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(INVALID_INDEX_SQL, [name])
+            invalid = cursor.fetchone() is not None
+        if invalid:
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+        # CONCURRENTLY: la tabella resta scrivibile durante la costruzione
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "{table}" USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name(table, column)}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY non possono girare in una transazione
+    atomic = False
+
+    dependencies = [
+        ('sistema_gestione_veicoli', '0003_targa_stato'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 
+from .table_cache import invalidate_table_names, invalidate_tables
+
 class Veicolo(models.Model):
     telaio = models.CharField(
         max_length=50,
@@ -21,6 +23,12 @@ class Veicolo(models.Model):
         verbose_name = "veicolo"
         verbose_name_plural = "veicoli"
         ordering = ['telaio']
+        # indici (campo, pk) per la paginazione keyset di table_api
+        indexes = [
+            models.Index(fields=['marca', 'telaio'], name='veicolo_marca_keyset_idx'),
+            models.Index(fields=['modello', 'telaio'], name='veicolo_modello_keyset_idx'),
+            models.Index(fields=['dataProd', 'telaio'], name='veicolo_dataprod_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"{self.marca} {self.modello} ({self.telaio})"
@@ -28,7 +36,42 @@ class Veicolo(models.Model):
     def get_absolute_url(self):
         return reverse('veicolo_detail', kwargs={'pk': self.telaio})
 
+def stato_targa_expression():
+    """Espressione SQL che deriva lo stato della targa da targa_attiva/targa_restituita"""
+    return models.Case(
+        models.When(
+            models.Exists(TargaAttiva.objects.filter(targa=models.OuterRef('pk'))),
+            then=models.Value(Targa.STATO_ATTIVA),
+        ),
+        models.When(
+            models.Exists(TargaRestituita.objects.filter(targa=models.OuterRef('pk'))),
+            then=models.Value(Targa.STATO_RESTITUITA),
+        ),
+        default=models.Value(Targa.STATO_NON_ASSEGNATA),
+        output_field=models.CharField(),
+    )
+
+class TargaQuerySet(models.QuerySet):
+    def with_stato_calcolato(self):
+        """Annota `stato_calcolato` (lo stato derivato dalle assegnazioni)"""
+        return self.annotate(stato_calcolato=stato_targa_expression())
+
+    def refresh_stato(self):
+        """Riallinea la colonna stato delle targhe selezionate con un solo UPDATE"""
+        rows = self.update(stato=stato_targa_expression())
+        invalidate_table_names('targa')
+        return rows
+
 class Targa(models.Model):
+    STATO_ATTIVA = 'Attiva'
+    STATO_RESTITUITA = 'Restituita'
+    STATO_NON_ASSEGNATA = 'Non assegnata'
+    STATO_CHOICES = [
+        (STATO_ATTIVA, 'Attiva'),
+        (STATO_RESTITUITA, 'Restituita'),
+        (STATO_NON_ASSEGNATA, 'Non assegnata'),
+    ]
+
     numero = models.CharField(
         max_length=20,
         primary_key=True,
@@ -38,12 +81,27 @@ class Targa(models.Model):
         verbose_name="Data Emissione",
         db_column='dataEm'
     )
+    # denormalizzato: mantenuto da signals.py e da AssegnazioneTargaQuerySet,
+    # ricostruibile con `manage.py rebuild_stato_targhe`
+    stato = models.CharField(
+        max_length=20,
+        choices=STATO_CHOICES,
+        default=STATO_NON_ASSEGNATA,
+        editable=False,
+        verbose_name="stato"
+    )
+
+    objects = TargaQuerySet.as_manager()
 
     class Meta:
         db_table = 'targa'
         verbose_name = "targa"
         verbose_name_plural = "targhe"
         ordering = ['numero']
+        indexes = [
+            models.Index(fields=['dataEm', 'numero'], name='targa_dataem_keyset_idx'),
+            models.Index(fields=['stato', 'numero'], name='targa_stato_keyset_idx'),
+        ]
 
     def __str__(self):
         return self.numero
@@ -51,16 +109,13 @@ class Targa(models.Model):
     def get_absolute_url(self):
         return reverse('targa_detail', kwargs={'pk': self.numero})
 
-    @property
-    def stato(self):
-        """Restituisce lo stato della targa (Attiva, Restituita, Non assegnata)"""
-        try:
-            TargaAttiva.objects.get(targa=self)
-            return 'Attiva'
-        except TargaAttiva.DoesNotExist:
-            if TargaRestituita.objects.filter(targa=self).exists():
-                return 'Restituita'
-        return 'Non assegnata'
+    @classmethod
+    def normalizza_stato(cls, value):
+        """Converte un valore di filtro (es. 'attiva') nello stato canonico, o None"""
+        for stato, _ in cls.STATO_CHOICES:
+            if stato.lower() == (value or '').strip().lower():
+                return stato
+        return None
 
 class Revisione(models.Model):
     ESITO_CHOICES = [
@@ -96,6 +151,10 @@ class Revisione(models.Model):
         verbose_name = "revisione"
         verbose_name_plural = "revisioni"
         ordering = ['-dataRev']
+        indexes = [
+            models.Index(fields=['dataRev', 'numero'], name='revisione_datarev_keyset_idx'),
+            models.Index(fields=['esito', 'numero'], name='revisione_esito_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"revisione {self.numero} - {self.targa} ({self.esito})"
@@ -111,6 +170,41 @@ class Revisione(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
 
+class AssegnazioneTargaQuerySet(models.QuerySet):
+    """
+    QuerySet di TargaAttiva/TargaRestituita che tiene allineato Targa.stato
+    anche sui percorsi che non inviano segnali (bulk_create, update) e ne
+    invalida le cache come farebbero i segnali.
+    """
+
+    def _invalidate_caches(self):
+        # import locale: stats importa i modelli
+        from .stats import invalidate_dashboard_stats
+        invalidate_tables(self.model)
+        transaction.on_commit(invalidate_dashboard_stats)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        Targa.objects.filter(numero__in={obj.targa_id for obj in objs}).refresh_stato()
+        self._invalidate_caches()
+        return objs
+
+    def update(self, **kwargs):
+        self._invalidate_caches()
+        nuova = kwargs.get('targa', kwargs.get('targa_id'))
+        if nuova is None:
+            return super().update(**kwargs)
+
+        numeri = set(self.values_list('targa_id', flat=True))
+        rows = super().update(**kwargs)
+        if hasattr(nuova, 'resolve_expression'):
+            # destinazione non nota a priori: riallineo tutto
+            Targa.objects.refresh_stato()
+        else:
+            numeri.add(getattr(nuova, 'pk', nuova))
+            Targa.objects.filter(numero__in=numeri).refresh_stato()
+        return rows
+
 class TargaAttiva(models.Model):
     targa = models.OneToOneField(
         Targa,
@@ -127,6 +221,8 @@ class TargaAttiva(models.Model):
         verbose_name="veicolo"
     )
 
+    objects = AssegnazioneTargaQuerySet.as_manager()
+
     class Meta:
         db_table = 'targa_attiva'     # Tabella reale in minuscolo
         managed = True                # Ora Django creerà la tabella
@@ -152,8 +248,13 @@ class TargaRestituita(models.Model):
         verbose_name="Data Restituzione"
     )
 
+    objects = AssegnazioneTargaQuerySet.as_manager()
+
     class Meta:
         db_table = 'targa_restituita' # Tabella reale in minuscolo
         managed = True                # Ora Django creerà la tabella
         verbose_name = "targa restituita"
         verbose_name_plural = "targhe restituite"
+        indexes = [
+            models.Index(fields=['dataRes', 'targa'], name='targarest_datares_keyset_idx'),
+        ]
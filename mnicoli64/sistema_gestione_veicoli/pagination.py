@@ -0,0 +1,149 @@
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+from .fields import resolve_field
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """Cursore o limite di paginazione non validi"""
+
+
+def parse_limit(raw):
+    """Converte il parametro `limit` in un intero compreso tra 1 e MAX_PAGE_SIZE"""
+    if raw in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Parametro limit non valido')
+    if limit < 1:
+        raise InvalidCursor('Parametro limit non valido')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(sort_field, descending, key, pk):
+    """
+    Cursore opaco: JSON [campo di ordinamento, direzione, chiave, pk] in base64
+    url-safe. Campo e direzione servono a rifiutare un cursore usato con un
+    ordinamento diverso da quello che lo ha prodotto.
+    """
+    if isinstance(key, date):
+        key = key.isoformat()
+    direction = 'desc' if descending else 'asc'
+    raw = json.dumps([sort_field, direction, key, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Restituisce (campo, direzione, chiave, pk) senza validarne i valori"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        sort_field, direction, key, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor('Cursore non valido')
+    return sort_field, direction, key, pk
+
+
+class KeysetPaginator:
+    """
+    Paginazione keyset (seek method): ordina per (campo di ordinamento, pk)
+    e riparte dall'ultima coppia vista invece di usare OFFSET, così ogni
+    pagina è una scansione di intervallo sull'indice (campo, pk).
+    """
+
+    def __init__(self, sort_field, pk_field, descending=False, nullable=False,
+                 limit=DEFAULT_PAGE_SIZE):
+        self.sort_field = sort_field
+        self.pk_field = pk_field
+        self.descending = descending
+        self.nullable = nullable
+        self.limit = limit
+
+    def _ordering(self):
+        fields = (F(self.sort_field), F(self.pk_field))
+        if self.descending:
+            exprs = [f.desc(nulls_last=True) if self.nullable else f.desc() for f in fields]
+        else:
+            exprs = [f.asc(nulls_last=True) if self.nullable else f.asc() for f in fields]
+        return exprs
+
+    def _seek(self, key, pk):
+        cmp = 'lt' if self.descending else 'gt'
+        cmp_eq = 'lte' if self.descending else 'gte'
+        pk_after = Q(**{f'{self.pk_field}__{cmp}': pk})
+
+        if key is None:
+            # siamo già nella coda dei NULL (sempre in fondo)
+            return Q(**{f'{self.sort_field}__isnull': True}) & pk_after
+
+        # `campo >= v` è il limite sargabile per la scansione dell'indice,
+        # il resto scarta le righe già restituite con lo stesso valore
+        seek = Q(**{f'{self.sort_field}__{cmp_eq}': key}) & (
+            Q(**{f'{self.sort_field}__{cmp}': key}) | pk_after
+        )
+        if self.nullable:
+            seek |= Q(**{f'{self.sort_field}__isnull': True})
+        return seek
+
+    def decode(self, cursor, model):
+        """
+        Chiave e pk dal cursore, convertite con i campi del modello; InvalidCursor
+        se il cursore è di un altro ordinamento o i valori non sono compatibili.
+        """
+        sort_field, direction, key, pk = decode_cursor(cursor)
+        if sort_field != self.sort_field or direction != ('desc' if self.descending else 'asc'):
+            raise InvalidCursor('Cursore non valido per questo ordinamento')
+        if pk is None or (key is None and not self.nullable):
+            raise InvalidCursor('Cursore non valido')
+        try:
+            if key is not None:
+                key = resolve_field(model, self.sort_field)[0].to_python(key)
+            pk = resolve_field(model, self.pk_field)[0].to_python(pk)
+        except (ValidationError, TypeError):
+            raise InvalidCursor('Cursore non valido')
+        return key, pk
+
+    def order(self, qs):
+        """Solo l'ordinamento stabile (campo, pk), senza paginare"""
+        return qs.order_by(*self._ordering())
+
+    def paginate(self, qs, cursor=None):
+        """Applica ordinamento, seek e LIMIT (+1 per sapere se c'è un'altra pagina)"""
+        qs = qs.annotate(page_key=F(self.sort_field), page_pk=F(self.pk_field))
+        if cursor:
+            qs = qs.filter(self._seek(*self.decode(cursor, qs.model)))
+        return self.order(qs)[:self.limit + 1]
+
+    def page(self, rows):
+        """Restituisce (righe della pagina, next_cursor) e rimuove le chiavi interne"""
+        rows = list(rows)
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            if isinstance(last, dict):
+                key, pk = last['page_key'], last['page_pk']
+            elif isinstance(last, tuple):
+                # values_list(..., 'page_key', 'page_pk')
+                key, pk = last[-2], last[-1]
+            else:
+                key, pk = last.page_key, last.page_pk
+            next_cursor = encode_cursor(self.sort_field, self.descending, key, pk)
+
+        for i, row in enumerate(rows):
+            if isinstance(row, dict):
+                row.pop('page_key', None)
+                row.pop('page_pk', None)
+            elif isinstance(row, tuple):
+                rows[i] = row[:-2]
+        return rows, next_cursor
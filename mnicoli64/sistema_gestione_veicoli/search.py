@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import connection
+
+# lookup usato da ogni backend di ricerca testuale:
+# - trigram: sottostringa case-insensitive; su Postgres è servita dagli indici
+#   GIN pg_trgm (migrazione 0004), altrove è una scansione senza indici
+# - prefix: solo prefisso, usabile con un normale indice B-tree (fallback SQLite)
+SEARCH_LOOKUPS = {
+    'trigram': 'icontains',
+    'prefix': 'istartswith',
+}
+
+
+def search_backend():
+    """Backend di ricerca da TEXT_SEARCH_BACKEND, o scelto in base al database"""
+    backend = getattr(settings, 'TEXT_SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        return 'trigram' if connection.vendor == 'postgresql' else 'prefix'
+    return backend
+
+
+def text_search(qs, field, value):
+    """Applica il filtro testuale su `field` con il lookup del backend corrente"""
+    value = (value or '').strip()
+    if not value:
+        return qs
+    lookup = SEARCH_LOOKUPS[search_backend()]
+    return qs.filter(**{f'{field}__{lookup}': value})
@@ -0,0 +1,62 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # dipendenza opzionale: si usa il modulo json standard
+    orjson = None
+
+# formati delle righe nelle API tabellari: lista di oggetti (default) oppure
+# `columns` + `rows` come array posizionali (nomi dei campi non ripetuti)
+ROW_FORMATS = ('objects', 'compact')
+
+_encoder = DjangoJSONEncoder()
+
+
+def json_backend():
+    """'orjson' o 'stdlib' in base a settings.JSON_SERIALIZER ('auto' di default)"""
+    backend = getattr(settings, 'JSON_SERIALIZER', 'auto')
+    if backend == 'auto':
+        return 'orjson' if orjson is not None else 'stdlib'
+    if backend == 'orjson' and orjson is None:
+        raise ImportError("JSON_SERIALIZER = 'orjson' ma orjson non è installato")
+    return backend
+
+
+def dumps(data):
+    """
+    Serializza in bytes UTF-8. date/datetime/UUID sono gestiti nativamente
+    (ISO 8601), i tipi restanti (Decimal, lazy string) passano da DjangoJSONEncoder.
+    """
+    if json_backend() == 'orjson':
+        return orjson.dumps(data, default=_encoder.default)
+    return json.dumps(
+        data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')
+    ).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """Come JsonResponse, ma serializza con dumps() (orjson se disponibile)"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def table_payload(rows, columns, row_format='objects', **extra):
+    """
+    Corpo delle risposte tabellari a partire da tuple nello stesso ordine di
+    `columns`: `data` come lista di oggetti, oppure `rows` come lista di array
+    con row_format='compact'.
+    """
+    payload = {'status': 'success', 'columns': columns}
+    if row_format == 'compact':
+        payload['rows'] = [list(row) for row in rows]
+    else:
+        names = [col['name'] for col in columns]
+        payload['data'] = [dict(zip(names, row)) for row in rows]
+    payload.update(extra)
+    return payload
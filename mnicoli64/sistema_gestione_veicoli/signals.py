@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Targa, TargaAttiva, TargaRestituita
+from .stats import STATS_MODELS, invalidate_dashboard_stats
+from .table_cache import invalidate_tables
+
+
+@receiver(post_save, sender=TargaAttiva)
+@receiver(post_delete, sender=TargaAttiva)
+@receiver(post_save, sender=TargaRestituita)
+@receiver(post_delete, sender=TargaRestituita)
+def aggiorna_stato_targa(sender, instance, **kwargs):
+    """Riallinea Targa.stato quando un'assegnazione viene creata, spostata o eliminata"""
+    # vale anche per le cancellazioni a cascata (Veicolo/Targa): con un receiver
+    # collegato il Collector invia post_delete per ogni riga eliminata
+    Targa.objects.filter(numero=instance.targa_id).refresh_stato()
+
+
+def invalida_statistiche(sender, **kwargs):
+    """Ogni scrittura sui modelli della dashboard invalida le statistiche in cache"""
+    # dopo il commit: una lettura concorrente prima del commit rimetterebbe in
+    # cache i conteggi vecchi
+    transaction.on_commit(invalidate_dashboard_stats)
+
+
+for model in STATS_MODELS:
+    post_save.connect(invalida_statistiche, sender=model, dispatch_uid=f'stats-save-{model.__name__}')
+    post_delete.connect(invalida_statistiche, sender=model, dispatch_uid=f'stats-delete-{model.__name__}')
+
+
+def invalida_cache_tabelle(sender, **kwargs):
+    """Scritture (anche a cascata) invalidano le risposte in cache delle tabelle collegate"""
+    invalidate_tables(sender)
+
+
+for model in STATS_MODELS:
+    post_save.connect(invalida_cache_tabelle, sender=model, dispatch_uid=f'tables-save-{model.__name__}')
+    post_delete.connect(invalida_cache_tabelle, sender=model, dispatch_uid=f'tables-delete-{model.__name__}')
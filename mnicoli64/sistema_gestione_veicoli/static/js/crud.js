@@ -41,8 +41,8 @@ $(document).ready(function () {
             "success"
           );
 
-          // Reload data
-          loadTableData("");
+          // Reload data (stessi filtri e ordinamento della tabella mostrata)
+          loadTableData(tableState.filterData);
         } else {
           showNotification(
             '<i class="bi bi-exclamation-triangle"></i> ' + response.message,
@@ -140,8 +140,8 @@ $(document).ready(function () {
             "success"
           );
 
-          // Reload data
-          loadTableData("");
+          // Reload data (stessi filtri e ordinamento della tabella mostrata)
+          loadTableData(tableState.filterData);
         } else {
           showNotification(
             '<i class="bi bi-exclamation-triangle"></i> ' + response.message,
@@ -198,8 +198,8 @@ $(document).ready(function () {
             "success"
           );
 
-          // Reload data
-          loadTableData("");
+          // Reload data (stessi filtri e ordinamento della tabella mostrata)
+          loadTableData(tableState.filterData);
         } else {
           showNotification(
             '<i class="bi bi-exclamation-triangle"></i> ' + response.message,
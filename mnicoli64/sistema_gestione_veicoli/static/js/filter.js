@@ -1,21 +1,14 @@
 // Document ready function for filter functionality
 $(document).ready(function () {
+  // Applica i filtri mentre si digita, al massimo una richiesta ogni FILTER_DEBOUNCE_MS
+  const applyFiltersDebounced = debounce(applyFilters, FILTER_DEBOUNCE_MS);
+  $("#filter-form").on("input", "input, select", applyFiltersDebounced);
+
   // Submit filter form
   $("#filter-form").on("submit", function (e) {
     e.preventDefault();
-    const filterData = $(this).serialize();
-
-    // Show loading state
-    console.log("table loader show: ", $(".table-loader"));
-    $(".table-loader").show();
-
-    loadTableData(filterData);
-
-    console.log("table loader hide: ", $(".table-loader"));
-    $(".table-loader").hide();
-
-    // Aggiorna status filtri
-    updateFilterStatus();
+    applyFiltersDebounced.cancel();
+    applyFilters();
 
     // Show feedback that filters are applied
     showNotification(
@@ -66,7 +59,14 @@ $(document).ready(function () {
       }
     });
 
-  if (hasFilters) {
+  // Prima pagina già incorporata dal server (stessi filtri dell'URL): nessuna richiesta
+  const initial = readInitialTable();
+  if (initial) {
+    hydrateTable(initial);
+    if (hasFilters) {
+      updateFilterStatus();
+    }
+  } else if (hasFilters) {
     // Submit form se abbiamo trovato parametri
     $("#filter-form").trigger("submit");
   } else {
@@ -75,6 +75,13 @@ $(document).ready(function () {
   }
 });
 
+function applyFilters() {
+  loadTableData($("#filter-form").serialize());
+
+  // Aggiorna status filtri
+  updateFilterStatus();
+}
+
 // Function to update filter status indicators
 function updateFilterStatus() {
   const activeFilters = [];
@@ -120,56 +127,172 @@ function showNotification(message, type = "info") {
   }, 5000);
 }
 
-// Function to load table data with filters
-function loadTableData(filterData) {
-  console.log("loadTableData");
+// Stato della tabella: righe già caricate (formato compatto, array nello stesso
+// ordine di `columns`), cursore della pagina successiva e ordinamento corrente
+const TABLE_PAGE_SIZE = 200;
+const tableState = {
+  tableName: null,
+  filterData: "",
+  columns: [],
+  rows: [],
+  nextCursor: null,
+  loading: false,
+  sortField: null,
+  sortOrder: "asc",
+};
+
+// ─── Gestore delle richieste ─────────────────────────────────────────────────
+// - una richiesta per "canale" (pagina, pagina successiva, facet): quella nuova
+//   annulla la precedente ancora in corso, così le risposte non arrivano fuori ordine
+// - richieste identiche già in corso vengono condivise invece di ripetute
+// - LRU delle ultime risposte per query: una query recente (es. avanti e indietro
+//   sull'ordinamento) viene mostrata subito e poi rivalidata con If-None-Match
+//   (se i dati non sono cambiati il server risponde 304 senza corpo)
+const REQUEST_CACHE_MAX = 20;
+const FILTER_DEBOUNCE_MS = 400;
+
+const requestManager = {
+  responses: new Map(), // query -> { etag, response }, in ordine di utilizzo
+  inflight: new Map(), // query -> { xhr, subscribers }
+  channels: {}, // canale -> query della richiesta in corso
+
+  cached(key) {
+    const entry = this.responses.get(key);
+    if (entry) {
+      this.responses.delete(key);
+      this.responses.set(key, entry);
+    }
+    return entry;
+  },
+
+  remember(key, etag, response) {
+    this.responses.delete(key);
+    this.responses.set(key, { etag: etag, response: response });
+    if (this.responses.size > REQUEST_CACHE_MAX) {
+      this.responses.delete(this.responses.keys().next().value);
+    }
+  },
+
+  abort(channel) {
+    const key = this.channels[channel];
+    delete this.channels[channel];
+    const entry = key && this.inflight.get(key);
+    if (entry) {
+      entry.xhr.abort();
+    }
+  },
+
+  // `handlers`: success(response), error(xhr, status, error), complete();
+  // per una richiesta annullata non viene chiamato nessuno dei tre.
+  // Con `refresh` una risposta servita dalla cache viene consegnata di nuovo
+  // se la rivalidazione restituisce dati diversi.
+  fetch(url, query, channel, handlers, refresh = false) {
+    const key = url + "?" + query;
+    if (this.channels[channel] !== key) {
+      this.abort(channel);
+      this.channels[channel] = key;
+    }
+
+    const cached = this.cached(key);
+    const subscriber = {
+      handlers: handlers,
+      refresh: refresh,
+      etag: cached ? cached.etag : null,
+      delivered: Boolean(cached),
+    };
+    if (cached) {
+      handlers.success(cached.response);
+    }
 
+    const pending = this.inflight.get(key);
+    if (pending) {
+      pending.subscribers.push(subscriber);
+      return;
+    }
+
+    const entry = { subscribers: [subscriber] };
+    this.inflight.set(key, entry);
+    entry.xhr = $.ajax({
+      url: url,
+      type: "GET",
+      data: query,
+      dataType: "json",
+      headers: cached ? { "If-None-Match": cached.etag } : {},
+      success: (response, textStatus, xhr) => {
+        let etag = xhr.getResponseHeader("ETag");
+        if (xhr.status === 304 && cached) {
+          // dati invariati: riuso la risposta già ricevuta
+          response = cached.response;
+          etag = cached.etag;
+        } else if (etag) {
+          this.remember(key, etag, response);
+        }
+        entry.subscribers.forEach((s) => {
+          if (!s.delivered || (s.refresh && s.etag !== etag)) {
+            s.handlers.success(response);
+          }
+        });
+      },
+      error: (xhr, status, error) => {
+        // richiesta superata da una più recente: nessun messaggio
+        if (status === "abort") return;
+        entry.subscribers.forEach((s) => {
+          if (s.handlers.error) s.handlers.error(xhr, status, error);
+        });
+      },
+      complete: (xhr, status) => {
+        this.inflight.delete(key);
+        if (this.channels[channel] === key) {
+          delete this.channels[channel];
+        }
+        // richiesta annullata: il canale è già di quella più recente, il suo
+        // complete (es. nascondere il loader) arriverà a tempo debito
+        if (status === "abort") return;
+        entry.subscribers.forEach((s) => {
+          if (s.handlers.complete) s.handlers.complete();
+        });
+      },
+    });
+  },
+};
+
+function debounce(fn, wait) {
+  let timer = null;
+  const debounced = function (...args) {
+    clearTimeout(timer);
+    timer = setTimeout(() => fn.apply(this, args), wait);
+  };
+  debounced.cancel = () => clearTimeout(timer);
+  return debounced;
+}
+
+// Function to load table data with filters
+// (se `cursor` è valorizzato la pagina viene accodata alle righe già caricate)
+function loadTableData(filterData, cursor = null) {
   const tableName = $("#table-container").data("table-name");
 
-  console.log(filterData + "&table=" + tableName);
+  // formato compatto: `columns` + `rows` (array), nomi dei campi non ripetuti
+  let query =
+    filterData + "&table=" + tableName + "&format=compact&limit=" + TABLE_PAGE_SIZE;
+  if (cursor) {
+    query += "&cursor=" + encodeURIComponent(cursor);
+  } else {
+    // una nuova query rende inutili le pagine successive di quella precedente
+    requestManager.abort("page");
+    loadFacets(filterData, tableName);
+  }
 
   // Show loading state
+  tableState.loading = true;
   $(".table-loader").show();
 
   // Hide empty state if visible
   $("#empty-state").hide();
 
-  $.ajax({
-    url: URL_API_TABLE,
-    type: "GET",
-    data: filterData + "&table=" + tableName,
-    dataType: "json",
+  requestManager.fetch(URL_API_TABLE, query, cursor ? "page" : "table", {
     success: function (response) {
-      if (response.status === "success") {
-        if (response.data.length === 0) {
-          // Show empty state
-          $("#empty-state").show();
-          $("#table-container").hide();
-        } else {
-          $("#empty-state").hide();
-          $("#table-container").show();
-
-          // ─── ESTRAGGO sort e order da filterData ─────────────────────────────
-          const params = new URLSearchParams(filterData);
-          const sortField = params.get("sort") || null;
-          const sortOrder = params.get("order") || null;
-          // ──────────────────────────────────────────────────────────────────────
-
-          renderTable(
-            response.data,
-            response.columns,
-            tableName,
-            sortField,
-            sortOrder
-          );
-        }
-      } else {
-        $("#table-container").html(
-          '<div class="alert alert-danger"><i class="bi bi-exclamation-triangle"></i> Errore nel caricamento dei dati: ' +
-          response.message +
-          "</div>"
-        );
-      }
+      $(".table-loader").hide();
+      applyTableResponse(filterData, cursor, response);
     },
     error: function (xhr, status, error) {
       $("#table-container").html(
@@ -178,32 +301,189 @@ function loadTableData(filterData) {
         "</div>"
       );
     },
-  });
+    complete: function () {
+      tableState.loading = false;
+      $(".table-loader").hide();
+    },
+  }, !cursor);
+}
+
+// Applica una risposta di table_api allo stato della tabella e la renderizza
+function applyTableResponse(filterData, cursor, response) {
+  const tableName = $("#table-container").data("table-name");
+
+  // pagina di una query non più corrente (o già accodata)
+  if (cursor && (filterData !== tableState.filterData || cursor !== tableState.nextCursor)) {
+    return;
+  }
+
+  if (response.status === "success") {
+    if (cursor) {
+      tableState.rows = tableState.rows.concat(response.rows);
+    } else {
+      // ─── ESTRAGGO sort e order da filterData ─────────────────────────────
+      const params = new URLSearchParams(filterData);
+      tableState.tableName = tableName;
+      tableState.filterData = filterData;
+      tableState.columns = response.columns;
+      tableState.rows = response.rows;
+      tableState.sortField = params.get("sort") || null;
+      tableState.sortOrder = params.get("order") || "asc";
+      // ──────────────────────────────────────────────────────────────────────
+    }
+    tableState.nextCursor = response.next_cursor || null;
+
+    if (tableState.rows.length === 0) {
+      // Show empty state
+      $("#empty-state").show();
+      $("#table-container").hide();
+    } else {
+      $("#empty-state").hide();
+      $("#table-container").show();
+      renderTable(!cursor);
+    }
+  } else {
+    $("#table-container").html(
+      '<div class="alert alert-danger"><i class="bi bi-exclamation-triangle"></i> Errore nel caricamento dei dati: ' +
+      response.message +
+      "</div>"
+    );
+  }
+}
+
+// Prima pagina incorporata nella pagina dal server (TableListView.initial_table)
+function readInitialTable() {
+  const script = document.getElementById("table-initial-data");
+  return script ? JSON.parse(script.textContent) : null;
+}
+
+function hydrateTable(initial) {
+  const tableName = $("#table-container").data("table-name");
+
+  // la stessa query fatta da loadTableData entra nella cache delle risposte:
+  // una ricarica successiva viene solo rivalidata con l'ETag
+  const query =
+    initial.filters + "&table=" + tableName + "&format=compact&limit=" + TABLE_PAGE_SIZE;
+  requestManager.remember(URL_API_TABLE + "?" + query, initial.etag, initial.response);
 
   $(".table-loader").hide();
+  applyTableResponse(initial.filters, null, initial.response);
+  loadFacets(initial.filters, tableName);
+}
+
+// Conteggi per valore (facet) con i filtri correnti: le opzioni delle select
+// mostrano quante righe restituirebbero, così si evitano ricerche vuote.
+// Si chiedono solo i facet delle select presenti nel pannello.
+function loadFacets(filterData, tableName) {
+  const facets = displayedFacets();
+  if (!facets.length) {
+    return;
+  }
+  const query =
+    filterData + "&table=" + tableName + "&facets=" + encodeURIComponent(facets.join(","));
+  requestManager.fetch(URL_API_TABLE_FACETS, query, "facets", {
+    success: function (response) {
+      if (response.status === "success") {
+        updateFacetCounts(response.facets);
+      }
+    },
+  }, true);
+}
+
+function displayedFacets() {
+  return $("#filter-form select[id^='filter-']")
+    .map(function () {
+      return this.id.slice("filter-".length);
+    })
+    .get();
+}
+
+function updateFacetCounts(facets) {
+  $.each(facets, function (name, values) {
+    const counts = {};
+    values.forEach((item) => {
+      counts[String(item.value).toLowerCase()] = item.count;
+    });
+
+    $("#filter-" + name + " option").each(function () {
+      const $option = $(this);
+      if (!$option.val()) {
+        return;
+      }
+      // etichetta originale salvata al primo aggiornamento
+      if ($option.data("label") === undefined) {
+        $option.data("label", $option.text().trim());
+      }
+      const count = counts[$option.val().toLowerCase()] || 0;
+      $option.text($option.data("label") + " (" + count + ")");
+    });
+  });
+}
+
+// ─── Rendering virtuale ──────────────────────────────────────────────────────
+// Nel <tbody> ci sono solo le righe visibili (più un margine), tra due righe
+// distanziatrici alte quanto quelle omesse; l'HTML della finestra visibile viene
+// costruito come stringa e inserito con un'unica assegnazione.
+const VIRTUAL_ROW_HEIGHT = 41; // stima iniziale, poi misurata sulla prima riga
+const VIRTUAL_OVERSCAN = 10; // righe renderizzate oltre l'area visibile
+const VIRTUAL_PREFETCH = 2; // pagina successiva a meno di N altezze di viewport
+
+const virtualView = {
+  rowHeight: VIRTUAL_ROW_HEIGHT,
+  start: -1,
+  end: -1,
+  frame: null,
+};
+
+function tableViewport() {
+  return $("#table-container .table-responsive");
+}
+
+// Collega (una volta) lo scroll del contenitore della tabella
+function initVirtualViewport() {
+  const $viewport = tableViewport();
+  if ($viewport.hasClass("table-viewport")) {
+    return;
+  }
+  $viewport.addClass("table-viewport").on("scroll", function () {
+    if (virtualView.frame === null) {
+      virtualView.frame = requestAnimationFrame(function () {
+        virtualView.frame = null;
+        renderVisibleRows(false);
+        maybeLoadNextPage();
+      });
+    }
+  });
+}
+
+// Pagina successiva dal cursore quando lo scroll si avvicina al fondo
+function maybeLoadNextPage() {
+  if (!tableState.nextCursor || tableState.loading) {
+    return;
+  }
+  const viewport = tableViewport()[0];
+  const remaining =
+    tableState.rows.length * virtualView.rowHeight -
+    (viewport.scrollTop + viewport.clientHeight);
+  if (remaining < viewport.clientHeight * VIRTUAL_PREFETCH) {
+    loadTableData(tableState.filterData, tableState.nextCursor);
+  }
 }
 
-function renderTable(
-  data,
-  columns,
-  tableName,
-  sortField = null,
-  sortOrder = "asc"
-) {
+function renderTable(reset = true) {
   const $table = $("#myTable");
   const $thead = $table.find("thead");
-  const $tbody = $table.find("tbody");
 
-  console.log("renderTable");
+  initVirtualViewport();
 
   // 1) Aggiorna i data-order e le icone sugli <th>
   $thead.find("th.sortable").each(function () {
     const $th = $(this);
     const col = $th.data("column");
-    const isSorted = col === sortField;
-    const order = isSorted ? sortOrder : "asc";
+    const isSorted = col === tableState.sortField;
+    const order = isSorted ? tableState.sortOrder : "asc";
     const icon = isSorted
-      ? `bi-arrow-${sortOrder === "asc" ? "up" : "down"}`
+      ? `bi-arrow-${tableState.sortOrder === "asc" ? "up" : "down"}`
       : "bi-arrow-down-up text-muted small";
 
     $th
@@ -212,58 +492,12 @@ function renderTable(
       .attr("class", "bi " + icon);
   });
 
-  // 2) Popola il <tbody>
-  $tbody.empty();
-  data.forEach((row) => {
-    let $tr = $("<tr>");
-    columns.forEach((col) => {
-      let cell = row[col.name] || "";
-
-      if (col.type === "date") {
-        cell = cell ? formatDate(cell) : "";
-      } else if (col.type === "status") {
-        let badgeClass = "",
-          icon = "";
-        switch (cell) {
-          case "Attiva":
-            badgeClass = "bg-success";
-            icon = "bi-check-circle-fill";
-            break;
-          case "Restituita":
-            badgeClass = "bg-warning text-dark";
-            icon = "bi-arrow-return-left";
-            break;
-          default:
-            badgeClass = "bg-secondary";
-            icon = "bi-dash-circle";
-        }
-        cell = `<span class="badge ${badgeClass}"><i class="bi ${icon} me-1"></i>${cell}</span>`;
-      } else if (col.isLink) {
-        // cell = `<a href="./${col.linkTarget}.php?${col.name
-        //   }=${cell}" class="table-link" data-target="${col.linkTarget
-        //   }" data-value="${row[col.name]}">${cell}</a>`;
-
-        cell = `<a href="../${col.linkTarget}" class="table-link" data-target="${col.linkTarget}" data-value="${row[col.name]}">${cell}</a>`;
-
-      }
-      $tr.append($("<td>").html(cell));
-    });
-
-    console.log("tableName: ", tableName);
-
-    // azioni su Veicolo
-    if (tableName === "veicolo") {
-      const editBtn = `<button class="btn btn-sm btn-primary edit-btn" data-id="${row.telaio}"><i class="bi bi-pencil"></i></button>`;
-      const deleteBtn = `<button class="btn btn-sm btn-danger delete-btn" data-id="${row.telaio}"><i class="bi bi-trash"></i></button>`;
-      $tr.append(
-        $("<td class='text-center d-flex gap-3 justify-content-end'>").html(
-          editBtn + deleteBtn
-        )
-      );
-    }
-
-    $tbody.append($tr);
-  });
+  // 2) Righe visibili (dall'inizio dopo un nuovo filtro/ordinamento)
+  if (reset) {
+    tableViewport().scrollTop(0);
+  }
+  renderVisibleRows(true);
+  maybeLoadNextPage();
 
   // 3) Ricollega i listener
 
@@ -277,12 +511,172 @@ function renderTable(
       const column = $th.data("column");
       const current = $th.data("order");
       const next = current === "asc" ? "desc" : "asc";
+
+      // tutte le righe già caricate: si ordina nel browser, senza richieste
+      if (fullSetLoaded() && sortRowsLocally(column, next)) {
+        renderTable(true);
+        return;
+      }
+
       const params =
         $("#filter-form").serialize() + "&sort=" + column + "&order=" + next;
       loadTableData(params);
     });
 }
 
+function renderVisibleRows(force) {
+  const viewport = tableViewport()[0];
+  const tbody = $("#myTable tbody")[0];
+  const total = tableState.rows.length;
+  const height = virtualView.rowHeight;
+
+  let start = Math.max(0, Math.floor(viewport.scrollTop / height) - VIRTUAL_OVERSCAN);
+  // inizio sempre pari: l'alternanza delle righe (table-striped) non cambia con lo scroll
+  start -= start % 2;
+  const end = Math.min(
+    total,
+    Math.ceil((viewport.scrollTop + viewport.clientHeight) / height) + VIRTUAL_OVERSCAN
+  );
+
+  if (!force && start === virtualView.start && end === virtualView.end) {
+    return;
+  }
+  virtualView.start = start;
+  virtualView.end = end;
+
+  const colspan = tableState.columns.length + (tableState.tableName === "veicolo" ? 1 : 0);
+  const html = [spacerRow(start * height, colspan)];
+  for (let i = start; i < end; i++) {
+    html.push(rowHtml(tableState.rows[i]));
+  }
+  html.push(spacerRow((total - end) * height, colspan));
+  tbody.innerHTML = html.join("");
+
+  // altezza reale delle righe (dipende da CSS e contenuto delle celle)
+  const first = tbody.rows[1];
+  if (first && end > start && first.offsetHeight && first.offsetHeight !== height) {
+    virtualView.rowHeight = first.offsetHeight;
+    renderVisibleRows(true);
+  }
+}
+
+function spacerRow(height, colspan) {
+  return `<tr class="virtual-spacer" aria-hidden="true"><td colspan="${colspan}" style="height:${height}px"></td></tr>`;
+}
+
+function escapeHtml(value) {
+  return String(value)
+    .replace(/&/g, "&amp;")
+    .replace(/</g, "&lt;")
+    .replace(/>/g, "&gt;")
+    .replace(/"/g, "&quot;")
+    .replace(/'/g, "&#39;");
+}
+
+function cellHtml(col, value) {
+  if (value === null || value === undefined || value === "") {
+    return "";
+  }
+  if (col.type === "date") {
+    return formatDate(value);
+  }
+  const text = escapeHtml(value);
+  if (col.type === "status") {
+    let badgeClass = "",
+      icon = "";
+    switch (value) {
+      case "Attiva":
+        badgeClass = "bg-success";
+        icon = "bi-check-circle-fill";
+        break;
+      case "Restituita":
+        badgeClass = "bg-warning text-dark";
+        icon = "bi-arrow-return-left";
+        break;
+      default:
+        badgeClass = "bg-secondary";
+        icon = "bi-dash-circle";
+    }
+    return `<span class="badge ${badgeClass}"><i class="bi ${icon} me-1"></i>${text}</span>`;
+  }
+  if (col.isLink) {
+    return `<a href="../${col.linkTarget}" class="table-link" data-target="${col.linkTarget}" data-value="${text}">${text}</a>`;
+  }
+  return text;
+}
+
+function rowHtml(row) {
+  let html = "<tr>";
+  tableState.columns.forEach((col, i) => {
+    html += "<td>" + cellHtml(col, row[i]) + "</td>";
+  });
+
+  // azioni su Veicolo (telaio è la prima colonna)
+  if (tableState.tableName === "veicolo") {
+    const id = escapeHtml(row[0]);
+    const editBtn = `<button class="btn btn-sm btn-primary edit-btn" data-id="${id}"><i class="bi bi-pencil"></i></button>`;
+    const deleteBtn = `<button class="btn btn-sm btn-danger delete-btn" data-id="${id}"><i class="bi bi-trash"></i></button>`;
+    html += `<td class='text-center d-flex gap-3 justify-content-end'>${editBtn}${deleteBtn}</td>`;
+  }
+  return html + "</tr>";
+}
+
+// Tutte le righe della query corrente sono nel browser: nessuna pagina
+// successiva e nessuna richiesta (nuova query o pagina) ancora in corso
+function fullSetLoaded() {
+  return tableState.tableName !== null && !tableState.loading && !tableState.nextCursor;
+}
+
+// Confronto per code point (non per unità UTF-16 come `<`, né per lingua come
+// localeCompare): è l'ordine di SQLite e di Postgres con collation "C"
+function compareCodePoints(a, b) {
+  const length = Math.min(a.length, b.length);
+  for (let i = 0; i < length; i++) {
+    const ca = a.codePointAt(i);
+    const cb = b.codePointAt(i);
+    if (ca !== cb) return ca < cb ? -1 : 1;
+    if (ca > 0xffff) i++; // coppia surrogata: un solo code point
+  }
+  return a.length === b.length ? 0 : a.length < b.length ? -1 : 1;
+}
+
+// Ordinamento nel browser, da usare solo con fullSetLoaded(): le righe non
+// vengono mai mescolate con pagine chieste al server. Come KeysetPaginator i
+// NULL restano in fondo in entrambe le direzioni e la chiave primaria (prima
+// colonna) fa da spareggio. I testi sono confrontati per code point: con una
+// collation linguistica sul database l'ordine del server può differire per
+// maiuscole e accenti, e la ricarica successiva mostra quello del server.
+// Restituisce false se la colonna non è tra quelle caricate.
+function sortRowsLocally(column, order) {
+  const index = tableState.columns.findIndex((col) => col.name === column);
+  if (index === -1) {
+    return false;
+  }
+  const direction = order === "desc" ? -1 : 1;
+
+  function compare(a, b) {
+    if (a === b) return 0;
+    if (a === null || a === undefined) return 1;
+    if (b === null || b === undefined) return -1;
+    if (typeof a === "number" && typeof b === "number") {
+      return (a < b ? -1 : 1) * direction;
+    }
+    return compareCodePoints(String(a), String(b)) * direction;
+  }
+
+  tableState.rows.sort((a, b) => compare(a[index], b[index]) || compare(a[0], b[0]));
+  tableState.sortField = column;
+  tableState.sortOrder = order;
+
+  // sort/order anche in filterData: le ricariche con tableState.filterData
+  // (es. dopo una modifica, vedi crud.js) chiedono al server lo stesso ordinamento
+  const params = new URLSearchParams(tableState.filterData);
+  params.set("sort", column);
+  params.set("order", order);
+  tableState.filterData = params.toString();
+  return true;
+}
+
 // Function to format date for display
 function formatDate(dateString) {
   if (!dateString) return "";
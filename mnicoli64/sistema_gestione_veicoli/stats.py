@@ -0,0 +1,116 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, DatabaseError
+
+from .models import Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_KEY = 'sistema_gestione_veicoli:dashboard_stats'
+
+# modelli le cui scritture invalidano le statistiche (vedi signals.py)
+STATS_MODELS = (Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita)
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def compute_exact_stats():
+    """Tutti i conteggi della dashboard in un'unica query (aggregazione condizionale)"""
+    sql = f"""
+        SELECT
+            (SELECT COUNT(*) FROM {_table(Veicolo)}),
+            (SELECT COUNT(*) FROM {_table(Targa)}),
+            (SELECT COUNT(*) FROM {_table(TargaAttiva)}),
+            (SELECT COUNT(*) FROM {_table(TargaRestituita)}),
+            COUNT(*),
+            COUNT(CASE WHEN esito = %s THEN 1 END),
+            COUNT(CASE WHEN esito = %s THEN 1 END)
+        FROM {_table(Revisione)}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ['positivo', 'negativo'])
+        row = cursor.fetchone()
+
+    keys = (
+        'total_veicoli', 'total_targhe', 'targhe_attive', 'targhe_restituite',
+        'revisioni_totali', 'revisioni_positive', 'revisioni_negative',
+    )
+    return dict(zip(keys, row))
+
+
+def compute_approximate_stats():
+    """
+    Stima dei conteggi dalle statistiche del planner Postgres (pg_class.reltuples
+    e pg_stats per la distribuzione di esito). Restituisce None se le statistiche
+    non sono disponibili (tabelle mai analizzate o backend diverso da Postgres).
+    """
+    if connection.vendor != 'postgresql':
+        return None
+
+    def reltuples(model):
+        return f"(SELECT reltuples::bigint FROM pg_class WHERE oid = '{_table(model)}'::regclass)"
+
+    sql = f"""
+        SELECT
+            {reltuples(Veicolo)},
+            {reltuples(Targa)},
+            {reltuples(TargaAttiva)},
+            {reltuples(TargaRestituita)},
+            {reltuples(Revisione)},
+            (SELECT most_common_vals::text::text[] FROM pg_stats
+              WHERE tablename = %s AND attname = 'esito'),
+            (SELECT most_common_freqs FROM pg_stats
+              WHERE tablename = %s AND attname = 'esito')
+    """
+    table = Revisione._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table, table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        logger.warning("Statistiche del planner non disponibili", exc_info=True)
+        return None
+
+    totals, esiti, freqs = row[:5], row[5] or [], row[6] or []
+    # reltuples = -1 (o NULL) se la tabella non è mai stata analizzata
+    if any(t is None or t < 0 for t in totals):
+        return None
+
+    freq_by_esito = dict(zip(esiti, freqs))
+    revisioni = totals[4]
+    return {
+        'total_veicoli': totals[0],
+        'total_targhe': totals[1],
+        'targhe_attive': totals[2],
+        'targhe_restituite': totals[3],
+        'revisioni_totali': revisioni,
+        'revisioni_positive': round(revisioni * freq_by_esito.get('positivo', 0)),
+        'revisioni_negative': round(revisioni * freq_by_esito.get('negativo', 0)),
+    }
+
+
+def get_dashboard_stats():
+    """
+    Statistiche della dashboard, in cache per DASHBOARD_STATS_TTL secondi.
+    Con DASHBOARD_STATS_APPROXIMATE = True usa le stime del planner quando presenti.
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    stats = None
+    if getattr(settings, 'DASHBOARD_STATS_APPROXIMATE', False):
+        stats = compute_approximate_stats()
+    if stats is None:
+        stats = compute_exact_stats()
+
+    cache.set(STATS_CACHE_KEY, stats, getattr(settings, 'DASHBOARD_STATS_TTL', 60))
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(STATS_CACHE_KEY)
@@ -0,0 +1,297 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'sistema_gestione_veicoli:table_version:{}'
+RESPONSE_KEY = 'sistema_gestione_veicoli:table_response:{}:{}:{}:{}'
+LOCK_KEY = 'sistema_gestione_veicoli:table_lock:{}'
+
+# tabelle (parametro `table` delle API) i cui risultati dipendono da ciascun
+# modello: join (marca/modello, dataEm), stato denormalizzato e cascate
+TABLE_DEPENDENCIES = {
+    'Veicolo': ('veicolo', 'targa_attiva', 'targa_restituita'),
+    'Targa': ('targa', 'revisione', 'targa_attiva', 'targa_restituita'),
+    'Revisione': ('revisione',),
+    'TargaAttiva': ('targa_attiva', 'targa'),
+    'TargaRestituita': ('targa_restituita', 'targa'),
+}
+
+# parametri che non cambiano il risultato (es. cache buster di jQuery)
+IGNORED_PARAMS = {'_'}
+
+
+def _version_key(table):
+    return VERSION_KEY.format(table)
+
+
+def table_version(table):
+    """Versione corrente dei dati di `table` (cambia a ogni scrittura)"""
+    key = _version_key(table)
+    version = cache.get(key)
+    if version is None:
+        # valore iniziale mai usato prima: se la chiave viene espulsa dalla
+        # cache non si torna a una versione già vista (e a risposte vecchie)
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_table_versions(tables):
+    for table in tables:
+        key = _version_key(table)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate_table_names(*tables):
+    """
+    Incrementa al commit la versione di `tables`: una lettura concorrente che
+    vede ancora i dati vecchi li salva sotto la versione vecchia, mai sotto
+    quella nuova.
+    """
+    if tables:
+        transaction.on_commit(lambda: bump_table_versions(tables))
+
+
+def invalidate_tables(model):
+    """Invalida le risposte in cache delle tabelle che dipendono da `model`"""
+    invalidate_table_names(*TABLE_DEPENDENCIES.get(model.__name__, ()))
+
+
+def normalize_params(params, defaults=None):
+    """Parametri GET in forma canonica: senza valori vuoti, con i default, ordinati"""
+    normalized = dict(defaults or {})
+    for name in params:
+        if name in IGNORED_PARAMS:
+            continue
+        values = [v.strip() for v in params.getlist(name) if v.strip()]
+        if values:
+            normalized[name] = values if len(values) > 1 else values[0]
+    return sorted(normalized.items())
+
+
+def _params_digest(params, defaults=None):
+    return hashlib.sha1(
+        json.dumps(normalize_params(params, defaults), separators=(',', ':')).encode()
+    ).hexdigest()
+
+
+def response_cache_key(view_name, table, version, digest):
+    return RESPONSE_KEY.format(view_name, table, version, digest)
+
+
+def response_etag(view_name, table, version, digest):
+    """ETag della risposta: cambia con la versione della tabella o con i parametri"""
+    token = hashlib.sha1(f'{view_name}:{table}:{version}:{digest}'.encode()).hexdigest()
+    return f'"{token[:20]}"'
+
+
+def cached_table_payload(view_name, table, params, defaults, compute):
+    """
+    Corpo (dict) della risposta di `view_name` per `params` dalla stessa voce di
+    cache delle API, calcolandolo con compute() se manca; restituisce anche l'ETag.
+    Serve al rendering lato server di dati che il client chiederebbe all'API.
+    """
+    version = table_version(table)
+    digest = _params_digest(params, defaults)
+    etag = response_etag(view_name, table, version, digest)
+
+    ttl = getattr(settings, 'TABLE_CACHE_TTL', 300)
+    key = response_cache_key(view_name, table, version, digest)
+    cached = cache.get(key) if ttl else None
+    if cached is not None:
+        return json.loads(cached[0]), etag
+
+    payload = compute()
+    if ttl:
+        cache.set(key, (dumps(payload), 'application/json'), ttl)
+    return payload, etag
+
+
+class SingleFlight:
+    """
+    Coalescing delle chiamate concorrenti con la stessa chiave nel processo:
+    la prima esegue `fn`, le altre attendono e ricevono lo stesso risultato.
+    L'attesa dura al più `timeout` secondi: un leader bloccato su una query
+    lenta non ferma tutte le richieste identiche, che dopo il timeout
+    eseguono per conto proprio `fallback` (di default `fn`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None, fallback=None):
+        """
+        Restituisce (risultato, eseguito): eseguito è True se il risultato è
+        stato calcolato da questo thread (leader o attesa scaduta). Se il
+        leader fallisce gli altri ricevono None.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event(), 'result': None}
+
+        if not leader:
+            if call['event'].wait(timeout):
+                return call['result'], False
+            logger.warning("Attesa del leader scaduta dopo %ss, esecuzione indipendente", timeout)
+            return (fallback or fn)(), True
+
+        try:
+            call['result'] = fn()
+            return call['result'], True
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+
+
+_single_flight = SingleFlight()
+
+
+def _single_flight_settings():
+    return {
+        'ENABLED': True,
+        'LOCK_TIMEOUT': 30,
+        'WAIT': 10,
+        'POLL_INTERVAL': 0.05,
+        **getattr(settings, 'TABLE_SINGLE_FLIGHT', {}),
+    }
+
+
+def _wait_for_response(key, lock_key, options):
+    """
+    Un altro processo sta calcolando la stessa risposta: la si attende in cache
+    finché il lock è presente (al più WAIT secondi). None se non arriva.
+    """
+    deadline = time.monotonic() + options['WAIT']
+    while time.monotonic() < deadline:
+        time.sleep(options['POLL_INTERVAL'])
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        if cache.get(lock_key) is None:
+            return cache.get(key)
+    return None
+
+
+def cache_table_response(table=None, defaults=None):
+    """
+    Decoratore per le API tabellari: la risposta (corpo JSON già serializzato)
+    viene salvata in cache con chiave tabella + versione + parametri normalizzati
+    e invalidata dalle scritture tramite le versioni (vedi invalidate_tables).
+
+    Dalla stessa chiave deriva l'ETag: una richiesta con If-None-Match
+    corrispondente riceve 304 senza eseguire la query.
+
+    In caso di miss, richieste identiche concorrenti condividono una sola
+    esecuzione: nel processo (SingleFlight) e tra processi tramite un lock nella
+    cache (vedi settings.TABLE_SINGLE_FLIGHT).
+
+    `table` fisso (get_veicoli_data) oppure preso dal parametro GET `table`;
+    `defaults(table)` restituisce i valori di default dei parametri, così
+    richieste equivalenti condividono la stessa voce.
+    """
+    def decorator(view):
+        # import locale: tables importa i modelli, che importano questo modulo
+        from .tables import TABLES
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            name = table or request.GET.get('table', '')
+            if name not in TABLES:
+                return view(request, *args, **kwargs)
+
+            # versione letta prima della query: una scrittura concorrente
+            # produce al più una risposta nuova con l'ETag vecchio, mai il contrario
+            version = table_version(name)
+            digest = _params_digest(request.GET, defaults(name) if defaults else None)
+            etag = response_etag(view.__name__, name, version, digest)
+
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                patch_cache_control(not_modified, no_cache=True)
+                return not_modified
+
+            ttl = getattr(settings, 'TABLE_CACHE_TTL', 300)
+            key = response_cache_key(view.__name__, name, version, digest)
+            cached = cache.get(key) if ttl else None
+            if cached is not None:
+                response = HttpResponse(cached[0], content_type=cached[1])
+                response['X-Cache'] = 'HIT'
+            else:
+                options = _single_flight_settings()
+                own = {}
+
+                def compute(wait=True):
+                    # lock nella cache: tra processi diversi una sola esecuzione
+                    # per chiave, gli altri leggono la risposta appena salvata
+                    lock_key = LOCK_KEY.format(key)
+                    use_lock = options['ENABLED'] and bool(ttl)
+                    locked = use_lock and cache.add(lock_key, 1, options['LOCK_TIMEOUT'])
+                    if use_lock and not locked and wait:
+                        shared = _wait_for_response(key, lock_key, options)
+                        if shared is not None:
+                            return shared
+                    try:
+                        own['response'] = response = view(request, *args, **kwargs)
+                        if response.status_code != 200 or response.streaming:
+                            return None
+                        result = (response.content, response['Content-Type'])
+                        if ttl:
+                            cache.set(key, result, ttl)
+                        return result
+                    finally:
+                        if locked:
+                            cache.delete(lock_key)
+
+                if options['ENABLED']:
+                    # richieste identiche concorrenti nel processo: una sola query
+                    # (dopo WAIT secondi senza risposta dal leader la query si
+                    # esegue comunque, senza attendere di nuovo il lock)
+                    shared, _ = _single_flight.do(
+                        key, compute, timeout=options['WAIT'],
+                        fallback=lambda: compute(wait=False),
+                    )
+                else:
+                    shared = compute()
+
+                if 'response' in own:
+                    response = own['response']
+                    if shared is None:
+                        return response
+                    if ttl:
+                        response['X-Cache'] = 'MISS'
+                elif shared is not None:
+                    response = HttpResponse(shared[0], content_type=shared[1])
+                    response['X-Cache'] = 'COALESCED'
+                else:
+                    # il leader non ha prodotto una risposta condivisibile
+                    response = view(request, *args, **kwargs)
+                    if response.status_code != 200 or response.streaming:
+                        return response
+
+            response['ETag'] = etag
+            # il browser può conservare la risposta ma deve sempre rivalidarla
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
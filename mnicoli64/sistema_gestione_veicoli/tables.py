@@ -0,0 +1,381 @@
+"""
+Registro delle tabelle esposte da liste e API (table_api, export, get_*_data,
+ListView): per ogni tabella modello, filtri, colonne, campi ordinabili e
+chiave di paginazione. Le strutture derivate (percorsi ORM, lookup, colonne
+serializzate) vengono calcolate una volta all'import.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F
+from django.db.models.functions import ExtractYear
+
+from .fields import resolve_field
+from .models import Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita
+from .pagination import KeysetPaginator, parse_limit, DEFAULT_PAGE_SIZE
+from .search import text_search
+
+
+class InvalidTableRequest(ValueError):
+    """Parametri non validi (tabella, ordinamento, campi, valori dei filtri)"""
+
+
+# central configuration dict for each field
+FIELD_CONFIG = {
+    'telaio':      {'label': 'Numero Telaio',     'placeholder': 'Cerca per telaio...',      'type': 'text',   'icon': 'bi-upc-scan'},
+    'marca':       {'label': 'Marca',              'placeholder': 'Cerca per marca...',       'type': 'text',   'icon': 'bi-building'},
+    'modello':     {'label': 'Modello',            'placeholder': 'Cerca per modello...',     'type': 'text',   'icon': 'bi-car-front'},
+    'dataProd':    {'label': 'Data Produzione',    'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-date'},
+    'numero':      {'label': 'Numero',             'placeholder': 'Cerca per numero...',      'type': 'text',   'icon': 'bi-tag'},
+    'dataEm':      {'label': 'Data Emissione',     'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-date'},
+    'stato':       {'label': 'Stato Targa',        'placeholder': 'Seleziona stato...',       'type': 'select', 'icon': 'bi-flag',
+                    'options': [('attiva', 'Attiva'), ('restituita', 'Restituita'), ('Non assegnata', 'Non assegnata')]},
+    'targa':       {'label': 'Targa',              'placeholder': 'Cerca per targa...',       'type': 'text',   'icon': 'bi-tag'},
+    'veicolo':     {'label': 'Veicolo',            'placeholder': 'Cerca per veicolo...',     'type': 'text',   'icon': 'bi-car-front'},
+    'dataRev':     {'label': 'Data Revisione',     'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-check'},
+    'dataRes':     {'label': 'Data Restituzione',  'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-x'},
+    'esito':       {'label': 'Esito Revisione',    'placeholder': 'Seleziona esito...',       'type': 'select', 'icon': 'bi-clipboard-check',
+                    'options': [('positivo', 'Positivo'), ('negativo', 'Negativo')]},
+    'motivazione': {'label': 'Motivazione',        'placeholder': 'Cerca per motivazione...', 'type': 'text',   'icon': 'bi-chat-text'},
+}
+
+# lookup di default per tipo di campo del filtro: 'search' = text_search()
+LOOKUP_BY_TYPE = {
+    'text': 'search',
+    'date': 'exact',
+    'select': 'exact',
+}
+
+
+# parametri aggiuntivi: intervalli sui campi data e uguaglianza sulle chiavi
+RANGE_SUFFIXES = {'_from': 'gte', '_to': 'lte'}
+EXACT_SUFFIX = '_exact'
+
+
+class Filter:
+    """
+    Filtro su un parametro GET; il tipo di lookup deriva da FIELD_CONFIG.
+    compile() lo traduce, una volta per modello, nei parametri accettati.
+    """
+
+    def __init__(self, name, path=None, lookup=None, normalize=None):
+        self.name = name
+        self.path = path or name
+        self.config = FIELD_CONFIG[name]
+        self.lookup = lookup or LOOKUP_BY_TYPE[self.config['type']]
+        self.normalize = normalize
+        # parametro GET -> (argomento di filter(), conversione del valore);
+        # argomento None = ricerca testuale (text_search)
+        self.clauses = {}
+
+    def compile(self, model):
+        """
+        Precalcola gli argomenti di filter() per ogni parametro:
+        - `name`: ricerca testuale o lookup esatto (es. 'targa__dataEm__exact')
+        - `name_from` / `name_to`: intervallo sui campi data (indici (campo, pk))
+        - `name_exact`: uguaglianza sulla chiave primaria o sulla colonna della FK
+        """
+        field, key_path = resolve_field(model, self.path)
+        convert = self._converter(field)
+
+        if self.lookup == 'search':
+            self.clauses[self.name] = (None, None)
+        elif self.lookup == 'exact':
+            self.clauses[self.name] = (f'{self.path}__exact', convert)
+        else:
+            self.clauses[self.name] = (f'{self.path}__{self.lookup}', None)
+
+        if field.get_internal_type() == 'DateField':
+            for suffix, lookup in RANGE_SUFFIXES.items():
+                self.clauses[self.name + suffix] = (f'{self.path}__{lookup}', convert)
+        if key_path is not None:
+            self.clauses[self.name + EXACT_SUFFIX] = (f'{key_path}__exact', convert)
+        return self
+
+    def _converter(self, field):
+        normalize = self.normalize
+
+        def convert(value):
+            if normalize is not None:
+                value = normalize(value)
+            try:
+                return field.to_python(value)
+            except ValidationError:
+                raise InvalidTableRequest(f'Valore non valido per {self.name}: {value}')
+        return convert
+
+    def apply(self, qs, params):
+        for param, (kwarg, convert) in self.clauses.items():
+            value = params.get(param)
+            if not value:
+                continue
+            if kwarg is None:
+                qs = text_search(qs, self.path, value)
+            else:
+                qs = qs.filter(**{kwarg: convert(value) if convert else value})
+        return qs
+
+
+class Facet:
+    """
+    Conteggi per valore di un campo (per anno se `year`), con una sola query
+    GROUP BY; con `top` restano solo i valori più frequenti.
+    """
+
+    def __init__(self, name, path=None, year=False, top=None):
+        self.name = name
+        self.path = path or name
+        self.year = year
+        self.top = top
+
+    def counts(self, qs):
+        value = ExtractYear(self.path) if self.year else F(self.path)
+        rows = qs.order_by().values(value=value).annotate(count=Count('*'))
+        if self.top:
+            rows = rows.order_by('-count', 'value')[:self.top]
+        else:
+            rows = rows.order_by('value')
+        return [{'value': row['value'], 'count': row['count']} for row in rows]
+
+
+# valori mostrati per i facet "più frequenti" (es. marca)
+FACET_TOP = 10
+
+
+class Column:
+    """Colonna in output: nome pubblico, percorso ORM e metadati per il frontend"""
+
+    def __init__(self, name, label, path=None, **options):
+        self.name = name
+        self.path = path or name
+        self.definition = {'name': name, 'label': label, **options}
+
+
+class Table:
+    """
+    Descrizione dichiarativa di una tabella. `sort` mappa i parametri di
+    ordinamento sui percorsi ORM (di default quelli delle colonne).
+    """
+
+    def __init__(self, name, model, pk, columns, filters, default_sort,
+                 sort=None, nullable_sort=(), facets=()):
+        self.name = name
+        self.model = model
+        self.pk = pk
+        self.columns = columns
+        # filtri compilati all'import: un campo mancante è un errore all'avvio
+        self.filters = [f.compile(model) for f in filters]
+        self.facets = facets
+        self.default_sort = default_sort
+        self.sort_fields = sort or {col.name: col.path for col in columns}
+        self.nullable_sort = set(nullable_sort)
+
+        # piano precompilato
+        self.fields = [col.path for col in columns]
+        self.column_definitions = [col.definition for col in columns]
+        self.column_names = [col.name for col in columns]
+        self.filter_names = [f.name for f in filters]
+        self.params = [param for f in self.filters for param in f.clauses]
+
+    def queryset(self, params, exclude=None):
+        """Queryset filtrato (non ordinato), ignorando l'eventuale filtro `exclude`"""
+        qs = self.model._default_manager.all()
+        for f in self.filters:
+            if f.name != exclude:
+                qs = f.apply(qs, params)
+        return qs
+
+    def facet_counts(self, params):
+        """
+        Conteggi dei facet con i filtri correnti (solo quelli di `facets=a,b`,
+        se indicato). Il filtro sullo stesso campo del facet non si applica,
+        così restano visibili le alternative.
+        """
+        return {
+            facet.name: facet.counts(self.queryset(params, exclude=facet.name))
+            for facet in self.select_facets(params.get('facets'))
+        }
+
+    def select_facets(self, requested):
+        """Facet indicati in `facets=a,b` (tutti se il parametro manca)"""
+        if not requested:
+            return self.facets
+
+        names = {name.strip() for name in requested.split(',') if name.strip()}
+        unknown = names - {facet.name for facet in self.facets}
+        if unknown:
+            raise InvalidTableRequest(f"Facet non validi: {', '.join(sorted(unknown))}")
+        return [facet for facet in self.facets if facet.name in names]
+
+    def paginator(self, params, strict=True):
+        """
+        KeysetPaginator da sort/order/limit. Con strict=False un ordinamento non
+        ammesso ricade su quello di default invece di sollevare un errore.
+        """
+        default_sort, default_order = self.default_sort
+        sort = params.get('sort') or default_sort
+        order = (params.get('order') or default_order).lower()
+
+        if sort not in self.sort_fields:
+            if strict:
+                raise InvalidTableRequest('Campo di ordinamento non valido')
+            sort, order = default_sort, default_order
+
+        return KeysetPaginator(
+            self.sort_fields[sort],
+            self.pk,
+            descending=(order == 'desc'),
+            nullable=sort in self.nullable_sort,
+            limit=parse_limit(params.get('limit')) if strict else DEFAULT_PAGE_SIZE,
+        )
+
+    def order(self, qs, params):
+        """Solo l'ordinamento stabile (campo, pk) richiesto, senza paginare"""
+        return self.paginator(params, strict=False).order(qs)
+
+    def project(self, requested):
+        """
+        Proiezione `fields=a,b`: restituisce (percorsi ORM, colonne) ridotti alle
+        colonne richieste, nell'ordine della tabella. I join servono solo per i
+        percorsi rimasti (e per filtri/ordinamento).
+        """
+        if not requested:
+            return self.fields, self.column_definitions
+
+        names = {name.strip() for name in requested.split(',') if name.strip()}
+        unknown = names - set(self.column_names)
+        if unknown:
+            raise InvalidTableRequest(f"Campi non validi: {', '.join(sorted(unknown))}")
+
+        pairs = [
+            (field, col)
+            for field, col, name in zip(self.fields, self.column_definitions, self.column_names)
+            if name in names
+        ]
+        return [f for f, _ in pairs], [col for _, col in pairs]
+
+    def default_params(self):
+        """Valori di default di sort/order/limit (per la chiave della cache)"""
+        sort, order = self.default_sort
+        return {'sort': sort, 'order': order, 'limit': str(DEFAULT_PAGE_SIZE)}
+
+    def filter_panel(self, params):
+        """Configurazione dei campi del pannello filtri con il valore corrente"""
+        return [
+            {**f.config, 'name': f.name, 'value': params.get(f.name, '')}
+            for f in self.filters
+        ]
+
+    def plan(self, params):
+        """
+        Valida i parametri e restituisce (qs, fields, columns, paginator):
+        queryset filtrato, percorsi per values_list(), colonne e paginatore.
+        """
+        paginator = self.paginator(params)
+        fields, columns = self.project(params.get('fields'))
+        return self.queryset(params), fields, columns, paginator
+
+
+TABLES = {
+    table.name: table
+    for table in [
+        Table(
+            'veicolo', Veicolo, pk='telaio',
+            columns=[
+                Column('telaio', 'Telaio', isLink=True, linkTarget='veicoli'),
+                Column('marca', 'Marca'),
+                Column('modello', 'Modello'),
+                Column('dataProd', 'Data Produzione', type='date'),
+            ],
+            filters=[Filter('telaio'), Filter('marca'), Filter('modello'), Filter('dataProd')],
+            default_sort=('telaio', 'asc'),
+            facets=[Facet('marca', top=FACET_TOP), Facet('dataProd', year=True)],
+        ),
+        Table(
+            # stato è una colonna indicizzata (vedi Targa.stato)
+            'targa', Targa, pk='numero',
+            columns=[
+                Column('numero', 'Numero', isLink=True, linkTarget='targhe'),
+                Column('dataEm', 'Data Emissione', type='date'),
+                Column('stato', 'Stato', type='status'),
+            ],
+            filters=[
+                Filter('numero'),
+                Filter('dataEm'),
+                Filter('stato', normalize=Targa.normalizza_stato),
+            ],
+            default_sort=('numero', 'asc'),
+            facets=[Facet('stato'), Facet('dataEm', year=True)],
+        ),
+        Table(
+            'revisione', Revisione, pk='numero',
+            columns=[
+                Column('numero', 'Numero'),
+                Column('targa', 'Targa', path='targa_id', isLink=True, linkTarget='targhe'),
+                Column('dataRev', 'Data Revisione', type='date'),
+                Column('esito', 'Esito'),
+                Column('motivazione', 'Motivazione'),
+            ],
+            filters=[
+                Filter('numero', lookup='icontains'),
+                Filter('targa', path='targa__numero'),
+                Filter('dataRev'),
+                Filter('esito'),
+                Filter('motivazione'),
+            ],
+            default_sort=('dataRev', 'desc'),
+            nullable_sort=['motivazione'],
+            facets=[Facet('esito'), Facet('dataRev', year=True)],
+        ),
+        Table(
+            # i join su targa/veicolo li fa values_list() solo se servono
+            'targa_attiva', TargaAttiva, pk='targa_id',
+            columns=[
+                Column('targa', 'Targa', path='targa_id', isLink=True, linkTarget='targhe'),
+                Column('veicolo', 'Telaio Veicolo', path='veicolo_id', isLink=True, linkTarget='veicoli'),
+                Column('marca', 'Marca', path='veicolo__marca'),
+                Column('modello', 'Modello', path='veicolo__modello'),
+                Column('dataEm', 'Data Emissione', path='targa__dataEm', type='date'),
+            ],
+            filters=[
+                Filter('targa', path='targa__numero'),
+                Filter('veicolo', path='veicolo__telaio'),
+                Filter('dataEm', path='targa__dataEm'),
+            ],
+            default_sort=('targa', 'asc'),
+            facets=[
+                Facet('marca', path='veicolo__marca', top=FACET_TOP),
+                Facet('dataEm', path='targa__dataEm', year=True),
+            ],
+        ),
+        Table(
+            'targa_restituita', TargaRestituita, pk='targa_id',
+            columns=[
+                Column('targa', 'Targa', path='targa_id', isLink=True, linkTarget='targhe'),
+                Column('veicolo', 'Telaio Veicolo', path='veicolo_id', isLink=True, linkTarget='veicoli'),
+                Column('marca', 'Marca', path='veicolo__marca'),
+                Column('modello', 'Modello', path='veicolo__modello'),
+                Column('dataEm', 'Data Emissione', path='targa__dataEm', type='date'),
+                Column('dataRes', 'Data Restituzione', type='date'),
+            ],
+            filters=[
+                Filter('targa', path='targa__numero'),
+                Filter('veicolo', path='veicolo__telaio'),
+                Filter('dataEm', path='targa__dataEm'),
+                Filter('dataRes'),
+            ],
+            default_sort=('targa', 'asc'),
+            facets=[
+                Facet('marca', path='veicolo__marca', top=FACET_TOP),
+                Facet('dataEm', path='targa__dataEm', year=True),
+                Facet('dataRes', year=True),
+            ],
+        ),
+    ]
+}
+
+
+def get_table(name):
+    try:
+        return TABLES[name]
+    except KeyError:
+        raise InvalidTableRequest('Tabella non valida')
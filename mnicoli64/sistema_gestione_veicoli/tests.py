@@ -1,3 +1,1372 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Count, F
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+
+from prometheus_client import REGISTRY
+
+from mnicoli64.db.pooled_postgresql import pool as db_pool
+
+from . import bulk_import, serialization, table_cache, urls, views
+from .stats import STATS_CACHE_KEY, get_dashboard_stats
+from .bulk_import import ImportFormatError, import_veicoli, read_rows, validate_row
+from .models import Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita
+from .tables import TABLES
+
+# python manage.py test --settings=mnicoli64.settings_test
+
+
+def crea_flotta(start, n):
+    """
+    Aggiunge n veicoli e n targhe (indici start..start+n-1): 60% delle targhe
+    attive, 20% restituite, il resto non assegnate; due revisioni per targa.
+    """
+    giorno = date(2020, 1, 1)
+    indici = range(start, start + n)
+
+    Veicolo.objects.bulk_create([
+        Veicolo(
+            telaio=f'TEL{i:014d}',
+            marca='Fiat' if i % 2 else 'Ford',
+            modello='Panda' if i % 2 else 'Focus',
+            dataProd=giorno + timedelta(days=i % 365),
+        )
+        for i in indici
+    ])
+    Targa.objects.bulk_create([
+        Targa(numero=f'AB{i:05d}', dataEm=giorno + timedelta(days=i % 365))
+        for i in indici
+    ])
+    TargaAttiva.objects.bulk_create([
+        TargaAttiva(targa_id=f'AB{i:05d}', veicolo_id=f'TEL{i:014d}')
+        for i in indici if i % 10 < 6
+    ])
+    TargaRestituita.objects.bulk_create([
+        TargaRestituita(
+            targa_id=f'AB{i:05d}', veicolo_id=f'TEL{i:014d}',
+            dataRes=giorno + timedelta(days=i % 365),
+        )
+        for i in indici if 6 <= i % 10 < 8
+    ])
+    Revisione.objects.bulk_create([
+        Revisione(
+            targa_id=f'AB{i:05d}',
+            dataRev=giorno + timedelta(days=(i + k) % 365),
+            esito='negativo' if k else 'positivo',
+            motivazione='Freni non efficienti' if k else None,
+        )
+        for i in indici
+        for k in range(2)
+    ])
+
+
+class FlottaTestCase(TestCase):
+    """Flotta di 10 veicoli/targhe condivisa dalla classe, cache vuota a ogni test"""
+
+    @classmethod
+    def setUpTestData(cls):
+        crea_flotta(0, 10)
+
+    def setUp(self):
+        cache.clear()
+
+    def api(self, params, status=200):
+        response = self.client.get(reverse('api-table'), params)
+        self.assertEqual(response.status_code, status)
+        return response
+
+
+class QueryCountTests(TestCase):
+    """
+    Il numero di query di ogni view non deve dipendere dal numero di righe:
+    ogni caso viene misurato con SMALL e con LARGE righe per tabella e i
+    conteggi devono coincidere (protezione contro i pattern N+1).
+    """
+
+    SMALL = 10
+    LARGE = 1000
+
+    def count_queries(self, url_name, params=None):
+        # la cache (statistiche della dashboard) falserebbe il conteggio
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name), params or {})
+        return response, len(ctx)
+
+    def cursor_params(self, params):
+        """Parametri per la seconda pagina di table_api (limit ridotto)"""
+        params = {**params, 'limit': 1}
+        response = self.client.get(reverse('api-table'), params)
+        cursor = response.json()['next_cursor']
+        self.assertIsNotNone(cursor)
+        return {**params, 'cursor': cursor}
+
+    def assertConstantQueries(self, cases):
+        """cases: lista di (url_name, params, status atteso)"""
+        def misura():
+            counts = []
+            for url_name, params, status in cases:
+                params = dict(params or {})
+                if params.pop('_cursor', False):
+                    params = self.cursor_params(params)
+                response, count = self.count_queries(url_name, params)
+                self.assertEqual(response.status_code, status, (url_name, params))
+                counts.append(count)
+            return counts
+
+        crea_flotta(0, self.SMALL)
+        small = misura()
+        crea_flotta(self.SMALL, self.LARGE - self.SMALL)
+        large = misura()
+
+        for (url_name, params, _), n_small, n_large in zip(cases, small, large):
+            with self.subTest(url=url_name, params=params):
+                self.assertEqual(
+                    n_small, n_large,
+                    f'{url_name} {params}: {n_small} query con {self.SMALL} righe, '
+                    f'{n_large} con {self.LARGE}',
+                )
+
+    def test_dashboard(self):
+        self.assertConstantQueries([('dashboard', None, 200)])
+
+    def test_list_views(self):
+        self.assertConstantQueries([
+            ('veicoli_list', None, 200),
+            ('targhe_list', None, 200),
+            ('targhe_list', {'numero': 'AB', 'stato': 'attiva', 'sort': 'dataEm'}, 200),
+            ('revisioni_list', None, 200),
+            ('targhe_attive_list', None, 200),
+            ('targhe_restituite_list', None, 200),
+        ])
+
+    def test_veicoli_api(self):
+        self.assertConstantQueries([
+            ('veicoli_api', None, 200),
+            ('veicoli_api', {'marca': 'Fi', 'sort': 'dataProd', 'order': 'desc'}, 200),
+            ('veicoli_api', {'telaio': 'TEL', 'modello': 'Pa', 'dataProd': '2020-01-02'}, 200),
+        ])
+
+    def test_targhe_api(self):
+        self.assertConstantQueries([
+            ('targhe_api', None, 200),
+            ('targhe_api', {'stato': 'Restituita', 'sort': 'stato', 'order': 'desc'}, 200),
+            ('targhe_api', {'numero': 'AB', 'dataEm': '2020-01-02'}, 200),
+        ])
+
+    def test_table_api(self):
+        filtri = {
+            'veicolo': {'telaio': 'TEL', 'marca': 'Fi', 'modello': 'Pa', 'dataProd': '2020-01-02'},
+            'targa': {'numero': 'AB', 'dataEm': '2020-01-02', 'stato': 'attiva'},
+            'revisione': {
+                'numero': '1', 'targa': 'AB', 'dataRev': '2020-01-02',
+                'esito': 'negativo', 'motivazione': 'Freni',
+            },
+            'targa_attiva': {'targa': 'AB', 'veicolo': 'TEL', 'dataEm': '2020-01-02'},
+            'targa_restituita': {
+                'targa': 'AB', 'veicolo': 'TEL', 'dataEm': '2020-01-02', 'dataRes': '2020-01-02',
+            },
+        }
+
+        cases = [
+            ('api-table', {'table': 'inesistente'}, 400),
+            ('api-table', {'table': 'veicolo', 'sort': 'inesistente'}, 400),
+            ('api-table', {'table': 'veicolo', 'cursor': '!!'}, 400),
+            ('api-table', {'table': 'veicolo', 'fields': 'inesistente'}, 400),
+            ('api-table', {'table': 'targa_restituita', 'fields': 'targa,dataRes'}, 200),
+        ]
+        for table, spec in TABLES.items():
+            cases.append(('api-table', {'table': table}, 200))
+            cases.append(('api-table', {'table': table, **filtri[table]}, 200))
+            for sort in spec.sort_fields:
+                for order in ('asc', 'desc'):
+                    cases.append(('api-table', {'table': table, 'sort': sort, 'order': order}, 200))
+                    cases.append((
+                        'api-table',
+                        {'table': table, 'sort': sort, 'order': order, '_cursor': True},
+                        200,
+                    ))
+
+        self.assertConstantQueries(cases)
+
+
+class TableCacheTests(FlottaTestCase):
+    """Cache delle risposte delle API tabellari e invalidazione per versione"""
+
+    def get(self, url_name, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx)
+
+    def assertCached(self, url_name, params):
+        response, count = self.get(url_name, params)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(count, 0)
+        return response
+
+    def assertNotCached(self, url_name, params):
+        response, _ = self.get(url_name, params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        return response
+
+    def test_hit_con_parametri_normalizzati(self):
+        first = self.assertNotCached('api-table', {'table': 'veicolo'})
+        # stessi parametri espliciti, valori vuoti e cache buster: stessa voce
+        second = self.assertCached(
+            'api-table', {'table': 'veicolo', 'sort': 'telaio', 'order': 'asc', 'marca': '', '_': '1'}
+        )
+        self.assertEqual(first.content, second.content)
+        self.assertNotCached('api-table', {'table': 'veicolo', 'order': 'desc'})
+
+    def test_api_legacy_con_default_del_registro(self):
+        for url_name, table in (('veicoli_api', 'veicolo'), ('targhe_api', 'targa')):
+            self.assertNotCached(url_name, {})
+            # i default espliciti del registro producono la stessa chiave
+            self.assertCached(url_name, TABLES[table].default_params())
+
+    def test_invalidazione_su_scrittura(self):
+        self.assertNotCached('api-table', {'table': 'targa'})
+        self.assertNotCached('veicoli_api', {})
+        with self.captureOnCommitCallbacks(execute=True):
+            TargaAttiva.objects.create(targa_id='AB00009', veicolo_id='TEL00000000000009')
+        # lo stato della targa cambia: la tabella targa è invalidata, veicolo no
+        response = self.assertNotCached('api-table', {'table': 'targa'})
+        stati = {row['numero']: row['stato'] for row in response.json()['data']}
+        self.assertEqual(stati['AB00009'], Targa.STATO_ATTIVA)
+        self.assertCached('veicoli_api', {})
+
+    def test_invalidazione_a_cascata(self):
+        self.assertNotCached('api-table', {'table': 'targa_attiva'})
+        self.assertNotCached('api-table', {'table': 'revisione'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Targa.objects.filter(numero='AB00000').delete()
+        response = self.assertNotCached('api-table', {'table': 'targa_attiva'})
+        self.assertNotIn('AB00000', [row['targa'] for row in response.json()['data']])
+        response = self.assertNotCached('api-table', {'table': 'revisione'})
+        self.assertNotIn('AB00000', [row['targa'] for row in response.json()['data']])
+
+    def test_invalidazione_bulk(self):
+        self.assertNotCached('api-table', {'table': 'targa_restituita'})
+        with self.captureOnCommitCallbacks(execute=True):
+            TargaRestituita.objects.filter(targa_id='AB00006').update(dataRes=date(2024, 1, 1))
+        self.assertNotCached('api-table', {'table': 'targa_restituita'})
+
+    def test_backend_file(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': location,
+                }
+            }
+            with override_settings(CACHES=backend):
+                self.assertNotCached('targhe_api', {})
+                self.assertCached('targhe_api', {'sort': 'numero'})
+                with self.captureOnCommitCallbacks(execute=True):
+                    Targa.objects.create(numero='ZZ99999', dataEm=date(2024, 1, 1))
+                response = self.assertNotCached('targhe_api', {})
+                self.assertIn('ZZ99999', [row['numero'] for row in response.json()['data']])
+
+
+class ConditionalGetTests(FlottaTestCase):
+    """ETag sulle API tabellari: 304 senza query finché la tabella non cambia"""
+
+    # anche senza la cache delle risposte il 304 non esegue query
+    @override_settings(TABLE_CACHE_TTL=0)
+    def test_304_senza_query(self):
+        url = reverse('api-table')
+        response = self.client.get(url, {'table': 'revisione'})
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'table': 'revisione'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(ctx), 0)
+
+    def test_etag_per_parametri_e_versione(self):
+        url = reverse('api-table')
+        etag = self.client.get(url, {'table': 'veicolo'})['ETag']
+        self.assertNotEqual(etag, self.client.get(url, {'table': 'veicolo', 'marca': 'Fi'})['ETag'])
+        self.assertNotEqual(etag, self.client.get(url, {'table': 'targa'})['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            veicolo = Veicolo.objects.get(telaio='TEL00000000000001')
+            veicolo.marca = 'Lancia'
+            veicolo.save()
+        response = self.client.get(url, {'table': 'veicolo'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_errori_senza_etag(self):
+        response = self.api({'table': 'veicolo', 'sort': 'inesistente'}, status=400)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class SerializationTests(FlottaTestCase):
+    """Serializer JSON (orjson / stdlib) e formato compatto delle API tabellari"""
+
+    def test_formato_compatto(self):
+        for url_name, params in [
+            ('api-table', {'table': 'targa_restituita'}),
+            ('veicoli_api', {}),
+            ('targhe_api', {}),
+        ]:
+            with self.subTest(url=url_name):
+                objects = self.client.get(reverse(url_name), params).json()
+                compact = self.client.get(reverse(url_name), {**params, 'format': 'compact'}).json()
+                names = [col['name'] for col in compact['columns']]
+                self.assertNotIn('data', compact)
+                self.assertEqual([dict(zip(names, row)) for row in compact['rows']], objects['data'])
+
+        self.api({'table': 'targa', 'format': 'xml'}, status=400)
+
+    def test_backend_equivalenti(self):
+        bodies = []
+        for backend in ('stdlib', 'orjson'):
+            if backend == 'orjson' and serialization.orjson is None:
+                continue
+            with override_settings(JSON_SERIALIZER=backend):
+                cache.clear()
+                bodies.append(self.api({'table': 'targa_attiva'}).json())
+                # date in ISO 8601, come faceva strftime('%Y-%m-%d')
+                self.assertEqual(bodies[-1]['data'][0]['dataEm'], '2020-01-01')
+        self.assertTrue(all(body == bodies[0] for body in bodies))
+
+
+class CompressionTests(TestCase):
+    """CompressionMiddleware: soglia, content type ammessi e streaming"""
+
+    def setUp(self):
+        cache.clear()
+        crea_flotta(0, 50)
+
+    def test_json_compresso(self):
+        response = self.client.get(
+            reverse('api-table'), {'table': 'revisione'}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(json.loads(gzip.decompress(response.content))['status'], 'success')
+
+    def test_sotto_soglia_o_senza_accept_encoding(self):
+        response = self.client.get(
+            reverse('api-table'), {'table': 'targa', 'limit': 1}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(reverse('api-table'), {'table': 'revisione'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(
+            reverse('api-table'), {'table': 'revisione'}, HTTP_ACCEPT_ENCODING='gzip;q=0'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(RESPONSE_COMPRESSION={'CONTENT_TYPES': ['application/json']})
+    def test_content_type_non_ammesso(self):
+        response = self.client.get(reverse('metrics'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(
+            reverse('api-table'), {'table': 'revisione'}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_streaming(self):
+        response = self.client.get(
+            reverse('api-table-export'), {'table': 'veicolo'}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(len(content.splitlines()), 51)
+
+
+class ProjectionTests(FlottaTestCase):
+    """Parametro fields= di table_api: colonne richieste e join evitati"""
+
+    def test_solo_colonne_richieste_senza_join(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.api({'table': 'targa_attiva', 'fields': 'veicolo,targa'})
+        body = response.json()
+        self.assertEqual([col['name'] for col in body['columns']], ['targa', 'veicolo'])
+        self.assertEqual(set(body['data'][0]), {'targa', 'veicolo'})
+        self.assertNotIn('JOIN', ctx.captured_queries[0]['sql'])
+
+        # il join resta solo se serve (qui per l'ordinamento per marca)
+        response = self.api(
+            {'table': 'targa_attiva', 'fields': 'targa', 'sort': 'marca', 'format': 'compact'}
+        )
+        self.assertEqual(len(response.json()['rows'][0]), 1)
+
+    def test_campo_non_ammesso(self):
+        for url_name in ('api-table', 'api-table-export'):
+            response = self.client.get(reverse(url_name), {'table': 'veicolo', 'fields': 'telaio,password'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('password', response.json()['message'])
+
+    def test_export(self):
+        response = self.client.get(reverse('api-table-export'), {'table': 'targa', 'fields': 'numero'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[:2], ['numero', 'AB00000'])
+
+
+class TableRegistryTests(FlottaTestCase):
+    """Registro delle tabelle condiviso da ListView, table_api e get_*_data"""
+
+    def test_dipendenze_della_cache_sul_registro(self):
+        dipendenze = table_cache.TABLE_DEPENDENCIES
+        for names in dipendenze.values():
+            self.assertLessEqual(set(names), set(TABLES))
+        # ogni tabella è invalidata almeno dalle scritture sul proprio modello
+        for table in TABLES.values():
+            self.assertIn(table.name, dipendenze[table.model.__name__])
+
+    def test_stesso_ordinamento_di_table_api(self):
+        params = {'marca': 'Fi', 'sort': 'dataProd', 'order': 'desc'}
+        legacy = self.client.get(reverse('veicoli_api'), params).json()['data']
+        table = self.api({'table': 'veicolo', 'limit': 100, **params}).json()['data']
+        self.assertEqual(legacy, table)
+
+        response = self.client.get(reverse('veicoli_list'), params)
+        self.assertEqual(
+            [v.telaio for v in response.context['veicoli']],
+            [row['telaio'] for row in table[:20]],
+        )
+
+    def test_ordinamento_non_valido(self):
+        response = self.client.get(reverse('targhe_api'), {'sort': 'password'})
+        self.assertEqual(response.status_code, 400)
+        # nelle pagine HTML si torna all'ordinamento di default
+        response = self.client.get(reverse('targhe_list'), {'sort': 'password'})
+        self.assertEqual(response.status_code, 200)
+
+
+class FacetTests(FlottaTestCase):
+    """Conteggi per il pannello filtri: una query GROUP BY per facet, in cache"""
+
+    def facets(self, params):
+        response = self.client.get(reverse('api-table-facets'), params)
+        self.assertEqual(response.status_code, 200)
+        return {
+            name: {item['value']: item['count'] for item in values}
+            for name, values in response.json()['facets'].items()
+        }
+
+    def test_conteggi_con_filtri(self):
+        with self.assertNumQueries(2):
+            facets = self.facets({'table': 'targa', 'stato': 'attiva'})
+        # il filtro su stato non restringe il proprio facet
+        self.assertEqual(
+            facets['stato'],
+            {Targa.STATO_ATTIVA: 6, Targa.STATO_RESTITUITA: 2, Targa.STATO_NON_ASSEGNATA: 2},
+        )
+        self.assertEqual(facets['dataEm'], {2020: 6})
+
+        facets = self.facets({'table': 'revisione', 'targa': 'AB00001'})
+        self.assertEqual(facets['esito'], {'negativo': 1, 'positivo': 1})
+
+    def test_top_marche(self):
+        facets = self.facets({'table': 'targa_attiva'})
+        self.assertEqual(facets['marca'], {'Fiat': 3, 'Ford': 3})
+
+    def test_solo_facet_richiesti(self):
+        # il pannello mostra solo la select di stato: una sola query GROUP BY
+        with self.assertNumQueries(1):
+            facets = self.facets({'table': 'targa', 'facets': 'stato'})
+        self.assertEqual(set(facets), {'stato'})
+
+        response = self.client.get(
+            reverse('api-table-facets'), {'table': 'targa', 'facets': 'stato,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['message'])
+
+    def test_cache_e_invalidazione(self):
+        params = {'table': 'veicolo'}
+        self.facets(params)
+        with self.assertNumQueries(0):
+            self.facets(params)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Veicolo.objects.create(telaio='TELNUOVO', marca='Fiat', modello='Uno', dataProd=date(2021, 5, 1))
+        self.assertEqual(self.facets(params)['dataProd'], {2020: 10, 2021: 1})
+
+    def test_tabella_non_valida(self):
+        response = self.client.get(reverse('api-table-facets'), {'table': 'inesistente'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SingleFlightTests(FlottaTestCase):
+    """Richieste identiche concorrenti: una sola esecuzione della query"""
+
+    def test_stesso_processo(self):
+        flight = table_cache.SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'risultato'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('k', fn)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do('k', fn)))
+            for _ in range(3)
+        ]
+        for t in followers:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in [leader, *followers]:
+            t.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('risultato', False)] * 3 + [('risultato', True)])
+
+    def test_attesa_limitata_del_leader(self):
+        flight = table_cache.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def lenta():
+            started.set()
+            release.wait(5)
+            return 'leader'
+
+        leader = threading.Thread(target=flight.do, args=('k', lenta))
+        leader.start()
+        started.wait(5)
+        try:
+            # il leader è bloccato: dopo il timeout il risultato si calcola qui
+            inizio = time.monotonic()
+            result = flight.do('k', lambda: 'proprio', timeout=0.1)
+            self.assertLess(time.monotonic() - inizio, 2)
+            self.assertEqual(result, ('proprio', True))
+            self.assertEqual(
+                flight.do('k', lenta, timeout=0.1, fallback=lambda: 'fallback'),
+                ('fallback', True),
+            )
+        finally:
+            release.set()
+            leader.join(5)
+
+    @override_settings(TABLE_SINGLE_FLIGHT={'WAIT': 0.3})
+    def test_leader_bloccato_nel_processo(self):
+        params = {'table': 'targa'}
+        key = self.response_key(params)
+        # un'altra richiesta del processo è leader per la stessa chiave e non
+        # termina (né ha il lock nella cache, che qui viene comunque ignorato)
+        bloccata = {'event': threading.Event(), 'result': None}
+        cache.add(table_cache.LOCK_KEY.format(key), 1)
+        with mock.patch.dict(table_cache._single_flight._calls, {key: bloccata}):
+            inizio = time.monotonic()
+            response = self.client.get(reverse('api-table'), params)
+        # una sola attesa di WAIT, non una per il leader e una per il lock
+        self.assertLess(time.monotonic() - inizio, 0.55)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['data']), 10)
+
+    def response_key(self, params):
+        table = TABLES[params['table']]
+        digest = table_cache._params_digest(QueryDict(urlencode(params)), table.default_params())
+        version = table_cache.table_version(table.name)
+        return table_cache.response_cache_key('table_api', table.name, version, digest)
+
+    def test_lock_tra_processi(self):
+        params = {'table': 'veicolo'}
+        key = self.response_key(params)
+        # un altro processo ha il lock e salva la risposta poco dopo
+        cache.add(table_cache.LOCK_KEY.format(key), 1)
+        threading.Timer(0.1, cache.set, (key, (b'{"status":"success"}', 'application/json'))).start()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api-table'), params)
+        self.assertEqual(response['X-Cache'], 'COALESCED')
+        self.assertEqual(response.json(), {'status': 'success'})
+
+    @override_settings(TABLE_SINGLE_FLIGHT={'WAIT': 0.2})
+    def test_lock_scaduto(self):
+        params = {'table': 'targa'}
+        cache.add(table_cache.LOCK_KEY.format(self.response_key(params)), 1)
+        # la risposta non arriva entro WAIT: la query viene eseguita comunque
+        response = self.api(params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['data']), 10)
+
+
+class InitialTableTests(FlottaTestCase):
+    """Prima pagina di table_api incorporata nelle liste (json_script)"""
+
+    def test_stessa_risposta_di_table_api(self):
+        response = self.client.get(reverse('targhe_list'), {'stato': 'attiva', 'sort': 'dataEm'})
+        self.assertContains(response, 'id="table-initial-data"')
+        initial = response.context['initial_table']
+        self.assertEqual(initial['filters'], 'stato=attiva&sort=dataEm')
+        self.assertEqual(len(initial['response']['rows']), 6)
+
+        # la richiesta equivalente di filter.js trova la stessa voce di cache
+        api = self.api({
+            'stato': 'attiva', 'sort': 'dataEm', 'table': 'targa', 'format': 'compact', 'limit': 200,
+        })
+        self.assertEqual(api['X-Cache'], 'HIT')
+        self.assertEqual(api['ETag'], initial['etag'])
+        self.assertEqual(api.json(), json.loads(serialization.dumps(initial['response'])))
+
+    def test_liste_senza_count_ne_righe_duplicate(self):
+        # solo la query della prima pagina incorporata: nessun COUNT(*) della
+        # paginazione della ListView né righe renderizzate lato server
+        for url_name in ('veicoli_list', 'targhe_list', 'revisioni_list',
+                         'targhe_attive_list', 'targhe_restituite_list'):
+            with self.subTest(url=url_name):
+                cache.clear()
+                with self.assertNumQueries(1):
+                    response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['is_paginated'])
+                # con la prima pagina in cache nessuna query
+                with self.assertNumQueries(0):
+                    self.client.get(reverse(url_name))
+
+        response = self.client.get(reverse('targhe_list'))
+        self.assertNotContains(response, '<td>AB00000</td>')
+
+    def test_parametri_non_validi(self):
+        response = self.client.get(reverse('veicoli_list'), {'sort': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['initial_table'])
+
+
+class FilterSpecTests(FlottaTestCase):
+    """Filtri compilati dal registro: intervalli di date, chiavi esatte, valori non validi"""
+
+    def test_intervallo_di_date(self):
+        body = self.api(
+            {'table': 'veicolo', 'dataProd_from': '2020-01-03', 'dataProd_to': '2020-01-05'}
+        ).json()
+        self.assertEqual([row['dataProd'] for row in body['data']], ['2020-01-03', '2020-01-04', '2020-01-05'])
+
+        body = self.api({'table': 'targa_restituita', 'dataEm_from': '2020-01-08'}).json()
+        self.assertEqual([row['targa'] for row in body['data']], ['AB00007'])
+
+    def test_chiave_esatta_senza_join(self):
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.api(
+                {'table': 'revisione', 'targa_exact': 'AB00001', 'fields': 'numero,targa'}
+            ).json()
+        self.assertEqual({row['targa'] for row in body['data']}, {'AB00001'})
+        self.assertEqual(len(body['data']), 2)
+        self.assertNotIn('JOIN', ctx.captured_queries[0]['sql'])
+
+        # prefisso: la ricerca trova la targa, l'uguaglianza no
+        self.assertEqual(len(self.api({'table': 'targa', 'numero': 'AB0000'}).json()['data']), 10)
+        self.assertEqual(self.api({'table': 'targa', 'numero_exact': 'AB0000'}).json()['data'], [])
+
+    def test_valore_non_valido(self):
+        self.api({'table': 'targa', 'dataEm': 'ieri'}, status=400)
+        self.api({'table': 'revisione', 'numero_exact': 'abc'}, status=400)
+        self.assertEqual(self.client.get(reverse('veicoli_api'), {'dataProd_to': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-table-facets'), {'table': 'targa', 'dataEm': 'x'}).status_code, 400)
+
+        # le liste HTML non falliscono: nessun risultato
+        response = self.client.get(reverse('targhe_list'), {'dataEm': 'ieri'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['targhe']), [])
+
+    def test_liste_html_filtrate(self):
+        response = self.client.get(reverse('targhe_attive_list'), {'veicolo_exact': 'TEL00000000000001'})
+        self.assertEqual([t.targa_id for t in response.context['targhe_attive']], ['AB00001'])
+        self.assertEqual(response.context['initial_table']['filters'], 'veicolo_exact=TEL00000000000001')
+
+        response = self.client.get(reverse('revisioni_list'), {'esito': 'positivo', 'dataRev_to': '2020-01-03'})
+        self.assertEqual(
+            sorted(r.targa_id for r in response.context['revisioni']),
+            ['AB00000', 'AB00001', 'AB00002'],
+        )
+        self.assertContains(response, 'id="filter-motivazione"')
+        self.assertNotContains(response, 'type=""')
+
+
+class ImportTests(TestCase):
+    """Import massivo di veicoli (bulk_import.py): percorso ORM, eseguibile su SQLite"""
+
+    CSV = (
+        'telaio,marca,modello,dataProd\n'
+        'IMP001,Fiat,Panda,2021-01-01\n'
+        'IMP002,Ford,Focus,2021-02-01\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        Veicolo.objects.create(telaio='IMP000', marca='Fiat', modello='Uno', dataProd=date(2019, 1, 1))
+
+    def test_read_rows(self):
+        rows = list(read_rows(io.StringIO(self.CSV), 'csv'))
+        self.assertEqual(rows[0]['telaio'], 'IMP001')
+        self.assertEqual(list(read_rows(io.StringIO('[{"telaio": "X"}]'), 'json')), [{'telaio': 'X'}])
+
+        for content, fmt in [
+            ('telaio,marca\nX,Y\n', 'csv'),
+            ('{"telaio": "X"}', 'json'),
+            ('[', 'json'),
+            ('', 'xml'),
+        ]:
+            with self.assertRaises(ImportFormatError):
+                read_rows(io.StringIO(content), fmt)
+
+    def test_validate_row(self):
+        valida = {'telaio': ' IMP9 ', 'marca': 'Fiat', 'modello': 'Panda', 'dataProd': '2021-01-01'}
+        self.assertEqual(validate_row(valida), (('IMP9', 'Fiat', 'Panda', date(2021, 1, 1)), None))
+        for row in [
+            'non un dict',
+            {**valida, 'marca': ' '},
+            {**valida, 'telaio': 'X' * 51},
+            {**valida, 'dataProd': '01/01/2021'},
+        ]:
+            values, error = validate_row(row)
+            self.assertIsNone(values)
+            self.assertTrue(error)
+
+    def test_skip_update_ed_errori_per_riga(self):
+        rows = [
+            {'telaio': 'IMP000', 'marca': 'Fiat', 'modello': 'Tipo', 'dataProd': '2020-01-01'},
+            {'telaio': 'IMP001', 'marca': 'Fiat', 'modello': 'Panda', 'dataProd': '2021-01-01'},
+            {'telaio': 'IMP001', 'marca': 'Fiat', 'modello': 'Panda', 'dataProd': '2021-01-01'},
+            {'telaio': 'IMP002', 'marca': '', 'modello': 'Focus', 'dataProd': '2021-01-01'},
+        ]
+        report = import_veicoli(rows, mode='skip', batch_size=1)
+        self.assertEqual((report['total'], report['inserted'], report['updated']), (4, 1, 0))
+        self.assertEqual(
+            [(e['row'], e['telaio']) for e in report['errors']],
+            [(1, 'IMP000'), (3, 'IMP001'), (4, 'IMP002')],
+        )
+        self.assertIn('duplicato', report['errors'][1]['message'])
+        self.assertEqual(Veicolo.objects.get(telaio='IMP000').modello, 'Uno')
+
+        report = import_veicoli(rows[:2], mode='update')
+        self.assertEqual((report['inserted'], report['updated'], report['errors']), (0, 2, []))
+        self.assertEqual(Veicolo.objects.get(telaio='IMP000').modello, 'Tipo')
+
+        with self.assertRaises(ValueError):
+            import_veicoli(rows, mode='replace')
+
+    def test_errore_di_database_in_un_blocco(self):
+        originale = bulk_import._load_batch
+        chiamate = []
+
+        def load_batch(batch, mode):
+            chiamate.append(batch[0][0])
+            if len(chiamate) == 2:
+                raise DatabaseError('connessione persa')
+            return originale(batch, mode)
+
+        rows = [
+            {'telaio': f'IMP10{i}', 'marca': 'Fiat', 'modello': 'Panda', 'dataProd': '2021-01-01'}
+            for i in range(3)
+        ]
+        with mock.patch.object(bulk_import, '_load_batch', load_batch), \
+                mock.patch.object(bulk_import, 'invalidate_tables') as invalidate, \
+                mock.patch.object(bulk_import, 'invalidate_dashboard_stats') as invalidate_stats:
+            with self.captureOnCommitCallbacks(execute=True):
+                report = import_veicoli(rows, batch_size=1)
+                # statistiche invalidate solo al commit
+                invalidate_stats.assert_not_called()
+
+        self.assertEqual(report['inserted'], 2)
+        self.assertEqual([(e['row'], e['telaio']) for e in report['errors']], [(2, 'IMP101')])
+        self.assertIn('connessione persa', report['errors'][0]['message'])
+        self.assertTrue(Veicolo.objects.filter(telaio='IMP102').exists())
+        invalidate.assert_called_once_with(Veicolo)
+        invalidate_stats.assert_called_once_with()
+
+    def test_api(self):
+        url = reverse('import_veicoli_api')
+
+        upload = SimpleUploadedFile('veicoli.csv', self.CSV.encode())
+        body = self.client.post(url, {'file': upload}).json()
+        self.assertEqual(body['report']['inserted'], 2)
+
+        body = self.client.post(
+            url + '?mode=update', 'telaio,marca,modello,dataProd\nIMP001,Fiat,Punto,2021-01-01\n',
+            content_type='text/csv',
+        ).json()
+        self.assertEqual(body['report']['updated'], 1)
+
+        body = self.client.post(url, json.dumps([
+            {'telaio': 'IMP003', 'marca': 'Fiat', 'modello': 'Panda', 'dataProd': 'ieri'},
+        ]), content_type='application/json').json()
+        self.assertEqual(body['report']['errors'][0]['row'], 1)
+
+        self.assertEqual(self.client.post(url, {'mode': 'replace'}).status_code, 400)
+        self.assertEqual(self.client.post(url, 'x', content_type='text/plain').status_code, 400)
+        response = self.client.post(url, '[', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'veicoli.csv')
+            report_path = os.path.join(tmp, 'report.json')
+            with open(path, 'w') as f:
+                f.write(self.CSV + 'IMP000,Fiat,Uno,2019-01-01\n')
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_veicoli', path, '--report', report_path, stdout=out, stderr=err)
+            with open(report_path) as f:
+                report = json.load(f)
+
+        self.assertIn('2 inseriti', out.getvalue())
+        self.assertIn('riga 3 (IMP000)', err.getvalue())
+        self.assertEqual(report['errors'][0]['row'], 3)
+
+        with self.assertRaises(CommandError):
+            call_command('import_veicoli', '/percorso/inesistente.csv')
+
+
+class CursorTests(FlottaTestCase):
+    """Cursori keyset: legati all'ordinamento e con valori compatibili con i campi"""
+
+    def cursor(self, *values):
+        return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+    def test_pagine_successive(self):
+        params = {'sort': 'dataRev', 'order': 'desc', 'limit': 7}
+        seen = []
+        cursor = None
+        while True:
+            body = self.api({'table': 'revisione', **params, **({'cursor': cursor} if cursor else {})}).json()
+            seen += [row['numero'] for row in body['data']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 20)
+        self.assertEqual(len(set(seen)), 20)
+
+    def test_chiave_non_compatibile(self):
+        for valori in (('not-a-date', 'X'), ('2020-01-01', 'X')):
+            cursor = self.cursor('dataRev', 'asc', *valori)
+            self.api({'table': 'revisione', 'sort': 'dataRev', 'cursor': cursor}, status=400)
+
+    def test_ordinamento_diverso(self):
+        cursor = self.api({'table': 'revisione', 'sort': 'dataRev', 'limit': 2}).json()['next_cursor']
+        self.api({'table': 'revisione', 'sort': 'dataRev', 'cursor': cursor})
+        # senza order la revisione è ordinata desc (default della tabella)
+        for params in ({'sort': 'esito'}, {'sort': 'dataRev', 'order': 'asc'}):
+            response = self.api({'table': 'revisione', **params, 'cursor': cursor}, status=400)
+            self.assertIn('ordinamento', response.json()['message'])
+
+
+class FakeConnection:
+    """Connessione finta per ConnectionPool: `alive=False` simula la caduta lato server"""
+
+    def __init__(self):
+        self.closed = 0
+        self.alive = True
+        self.autocommit = True
+        self.info = mock.Mock(transaction_status=0)
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                if not conn.alive:
+                    raise DatabaseError('server closed the connection unexpectedly')
+
+        return Cursor()
+
+    def rollback(self):
+        if not self.alive:
+            raise DatabaseError('server closed the connection unexpectedly')
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(TestCase):
+    """Pool di connessioni: riuso, attese, timeout e scarto delle connessioni"""
+
+    def setUp(self):
+        self.pool = db_pool.ConnectionPool(max_size=2, timeout=0.1, slow_wait=10)
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_riuso_della_connessione_rilasciata(self):
+        conn = self.pool.acquire(self.connect)
+        self.assertEqual(self.pool.stats()['in_use'], 1)
+        self.pool.release(conn)
+        self.assertIs(self.pool.acquire(self.connect), conn)
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual((stats['in_use'], stats['idle']), (1, 0))
+
+    def test_timeout_con_pool_pieno(self):
+        self.pool.acquire(self.connect)
+        self.pool.acquire(self.connect)
+        with self.assertRaises(db_pool.PoolTimeout):
+            self.pool.acquire(self.connect)
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+
+    def test_attesa_di_una_connessione_rilasciata(self):
+        pool = db_pool.ConnectionPool(max_size=1, timeout=5, slow_wait=0.01)
+        conn = pool.acquire(self.connect)
+        threading.Timer(0.05, pool.release, (conn,)).start()
+        self.assertIs(pool.acquire(self.connect), conn)
+        self.assertEqual(pool.stats()['slow_waits'], 1)
+
+    def test_connessione_chiusa_scartata(self):
+        conn = self.pool.acquire(self.connect)
+        conn.close()
+        self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['connections_discarded'], 1)
+        self.assertIsNot(self.pool.acquire(self.connect), conn)
+
+    def test_connessione_caduta_scartata_al_prelievo(self):
+        conn = self.pool.acquire(self.connect)
+        self.pool.release(conn)
+        # il server chiude la connessione mentre è inattiva nel pool
+        conn.alive = False
+
+        nuova = self.pool.acquire(self.connect)
+        self.assertIsNot(nuova, conn)
+        self.assertTrue(conn.closed)
+        stats = self.pool.stats()
+        self.assertEqual(stats['health_check_failures'], 1)
+        self.assertEqual(stats['connections_opened'], 2)
+
+    def test_transazione_aperta_scartata_al_prelievo(self):
+        conn = self.pool.acquire(self.connect)
+        self.pool.release(conn)
+        conn.info.transaction_status = 2  # TRANSACTION_STATUS_INTRANS
+
+        self.assertIsNot(self.pool.acquire(self.connect), conn)
+        self.assertEqual(self.pool.stats()['health_check_failures'], 1)
+
+    def test_statistiche_esportate_su_metrics(self):
+        pool = db_pool.ConnectionPool(max_size=3)
+        pool.release(pool.acquire(self.connect))
+        with mock.patch.dict(db_pool._pools, {'test-pool': pool}):
+            response = self.client.get(reverse('metrics'))
+        body = response.content.decode()
+
+        labels = f'alias="test-pool",pid="{os.getpid()}"'
+        self.assertIn(f'db_pool_max_size{{{labels}}} 3.0', body)
+        self.assertIn(f'db_pool_connections_idle{{{labels}}} 1.0', body)
+        self.assertIn(f'db_pool_requests_total{{{labels}}} 1.0', body)
+        self.assertIn(f'db_pool_connections_opened_total{{{labels}}} 1.0', body)
+
+
+class MetricsTests(FlottaTestCase):
+    """Metriche Prometheus di MetricsMiddleware e di table_api"""
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_contatori_dopo_table_api(self):
+        richieste = self.sample('http_requests_total', view='api-table', method='GET', status='200')
+        osservazioni = self.sample('http_request_db_queries_count', view='api-table')
+        query = self.sample('http_request_db_queries_sum', view='api-table')
+        righe = self.sample('table_api_rows_sum', table='targa')
+
+        response = self.api({'table': 'targa'})
+
+        self.assertEqual(
+            self.sample('http_requests_total', view='api-table', method='GET', status='200'),
+            richieste + 1,
+        )
+        self.assertEqual(
+            self.sample('http_request_db_queries_count', view='api-table'), osservazioni + 1
+        )
+        # un solo collector per richiesta: le metriche e QueryTimingMiddleware
+        # vedono le stesse query
+        eseguite = response.wsgi_request.query_timing['queries']
+        self.assertGreater(eseguite, 0)
+        self.assertEqual(self.sample('http_request_db_queries_sum', view='api-table'), query + eseguite)
+        self.assertEqual(self.sample('table_api_rows_sum', table='targa'), righe + 10)
+
+    def test_un_solo_execute_wrapper(self):
+        wrappers = []
+
+        def view_wrappers(*args, **kwargs):
+            wrappers.append(len(connection.execute_wrappers))
+            return mock.DEFAULT
+
+        with mock.patch('sistema_gestione_veicoli.views.metrics.TABLE_ROWS.labels',
+                        side_effect=view_wrappers):
+            self.api({'table': 'veicolo'})
+        self.assertEqual(wrappers, [1])
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='segreto')
+    def test_accesso_limitato(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer altro').status_code, 403)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer segreto').status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='')
+    def test_token_vuoto_non_autorizza(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    def test_endpoint_metrics(self):
+        self.api({'table': 'veicolo'})
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="api-table"}', body)
+        self.assertIn('http_request_db_queries_bucket', body)
+        self.assertIn('table_api_rows_count{table="veicolo"}', body)
+
+
+class QueryTimingTests(FlottaTestCase):
+    """QueryTimingMiddleware: header Server-Timing, campionamento, soglie e log"""
+
+    def test_header_server_timing(self):
+        response = self.api({'table': 'veicolo'})
+        timing = response.wsgi_request.query_timing
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        self.assertIn(f'desc="{timing["queries"]} queries"', response['Server-Timing'])
+        self.assertEqual(timing['view'], 'api-table')
+        self.assertEqual(timing['status'], 200)
+        self.assertLessEqual(timing['view_ms'], timing['total_ms'])
+
+    def test_senza_view(self):
+        response = self.client.get('/inesistente/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(response.wsgi_request.query_timing['view_ms'])
+        self.assertNotIn('view;', response['Server-Timing'])
+
+    @override_settings(QUERY_TIMING={'HEADER': False})
+    def test_header_disattivato(self):
+        response = self.api({'table': 'veicolo'})
+        self.assertNotIn('Server-Timing', response)
+        self.assertTrue(hasattr(response.wsgi_request, 'query_timing'))
+
+    @override_settings(QUERY_TIMING={'SAMPLE_RATE': 0})
+    def test_campionamento_zero(self):
+        with self.assertNoLogs('sistema_gestione_veicoli.timing', 'INFO'):
+            response = self.api({'table': 'veicolo'})
+        self.assertNotIn('Server-Timing', response)
+        self.assertFalse(hasattr(response.wsgi_request, 'query_timing'))
+
+    @override_settings(QUERY_TIMING={'SAMPLE_RATE': 1})
+    def test_campionamento_uno(self):
+        for _ in range(3):
+            self.assertIn('Server-Timing', self.api({'table': 'veicolo'}))
+
+    @override_settings(QUERY_TIMING={'SAMPLE_RATE': 0.5})
+    def test_campionamento_parziale(self):
+        with mock.patch('sistema_gestione_veicoli.middleware.random.random', return_value=0.7):
+            self.assertNotIn('Server-Timing', self.api({'table': 'veicolo'}))
+        with mock.patch('sistema_gestione_veicoli.middleware.random.random', return_value=0.3):
+            self.assertIn('Server-Timing', self.api({'table': 'veicolo'}))
+
+    def test_riga_di_log_strutturata(self):
+        with self.assertLogs('sistema_gestione_veicoli.timing', 'INFO') as logs:
+            response = self.api({'table': 'veicolo'})
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        timing = json.loads(logs.records[0].getMessage())
+        self.assertEqual(timing, response.wsgi_request.query_timing)
+        self.assertEqual(
+            set(timing),
+            {'method', 'path', 'view', 'status', 'queries', 'db_ms', 'view_ms', 'total_ms',
+             'flagged'},
+        )
+        self.assertEqual(timing['path'], reverse('api-table'))
+        self.assertEqual(timing['flagged'], [])
+
+    @override_settings(QUERY_TIMING={'MAX_QUERIES': 0})
+    def test_soglia_query(self):
+        with self.assertLogs('sistema_gestione_veicoli.timing', 'WARNING') as logs:
+            self.api({'table': 'veicolo'})
+        self.assertEqual(json.loads(logs.records[0].getMessage())['flagged'], ['queries'])
+
+    @override_settings(QUERY_TIMING={'SLOW_DB_MS': -1, 'SLOW_TOTAL_MS': -1})
+    def test_soglie_di_tempo(self):
+        with self.assertLogs('sistema_gestione_veicoli.timing', 'WARNING') as logs:
+            self.api({'table': 'veicolo'})
+        self.assertEqual(
+            json.loads(logs.records[0].getMessage())['flagged'], ['db_time', 'total_time']
+        )
+
+    @override_settings(QUERY_TIMING={'MAX_QUERIES': None, 'SLOW_DB_MS': None,
+                                     'SLOW_TOTAL_MS': None})
+    def test_soglie_disattivate(self):
+        with self.assertLogs('sistema_gestione_veicoli.timing', 'INFO') as logs:
+            self.api({'table': 'veicolo'})
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['flagged'], [])
+
+
+class StatoTargaTests(TestCase):
+    """Colonna denormalizzata Targa.stato allineata alle assegnazioni"""
+
+    def setUp(self):
+        crea_flotta(0, 10)
+        self.veicolo = Veicolo.objects.create(
+            telaio='TELNUOVO', marca='Fiat', modello='Tipo', dataProd=date(2021, 1, 1)
+        )
+        self.targa = Targa.objects.create(numero='ZZ00001', dataEm=date(2021, 1, 1))
+
+    def stato(self, numero):
+        return Targa.objects.values_list('stato', flat=True).get(numero=numero)
+
+    def assertAllineate(self):
+        disallineate = Targa.objects.with_stato_calcolato().exclude(stato=F('stato_calcolato'))
+        self.assertFalse(disallineate.exists())
+
+    def test_bulk_create(self):
+        self.assertEqual(self.stato('AB00000'), Targa.STATO_ATTIVA)
+        self.assertEqual(self.stato('AB00006'), Targa.STATO_RESTITUITA)
+        self.assertEqual(self.stato('AB00008'), Targa.STATO_NON_ASSEGNATA)
+        self.assertAllineate()
+
+    def test_assegnazione_e_restituzione(self):
+        self.assertEqual(self.stato('ZZ00001'), Targa.STATO_NON_ASSEGNATA)
+
+        attiva = TargaAttiva.objects.create(targa=self.targa, veicolo=self.veicolo)
+        self.assertEqual(self.stato('ZZ00001'), Targa.STATO_ATTIVA)
+
+        # restituzione: l'assegnazione attiva diventa restituita
+        attiva.delete()
+        TargaRestituita.objects.create(
+            targa=self.targa, veicolo=self.veicolo, dataRes=date(2022, 1, 1)
+        )
+        self.assertEqual(self.stato('ZZ00001'), Targa.STATO_RESTITUITA)
+
+        TargaRestituita.objects.filter(targa=self.targa).get().delete()
+        self.assertEqual(self.stato('ZZ00001'), Targa.STATO_NON_ASSEGNATA)
+        self.assertAllineate()
+
+    def test_spostamento_su_altra_targa(self):
+        TargaAttiva.objects.filter(targa_id='AB00000').update(targa=self.targa)
+        self.assertEqual(self.stato('AB00000'), Targa.STATO_NON_ASSEGNATA)
+        self.assertEqual(self.stato('ZZ00001'), Targa.STATO_ATTIVA)
+        self.assertAllineate()
+
+    def test_update_senza_cambio_targa(self):
+        TargaRestituita.objects.filter(targa_id='AB00006').update(dataRes=date(2023, 1, 1))
+        self.assertEqual(self.stato('AB00006'), Targa.STATO_RESTITUITA)
+        self.assertAllineate()
+
+    def test_bulk_create_di_assegnazioni(self):
+        TargaAttiva.objects.bulk_create([TargaAttiva(targa=self.targa, veicolo=self.veicolo)])
+        self.assertEqual(self.stato('ZZ00001'), Targa.STATO_ATTIVA)
+        self.assertAllineate()
+
+    def test_cancellazione_a_cascata_del_veicolo(self):
+        Veicolo.objects.filter(telaio__in=['TEL00000000000000', 'TEL00000000000006']).delete()
+        self.assertEqual(self.stato('AB00000'), Targa.STATO_NON_ASSEGNATA)
+        self.assertEqual(self.stato('AB00006'), Targa.STATO_NON_ASSEGNATA)
+        self.assertAllineate()
+
+    def test_cancellazione_a_cascata_della_targa(self):
+        Targa.objects.filter(numero__in=['AB00000', 'AB00006']).delete()
+        self.assertFalse(TargaAttiva.objects.filter(targa_id='AB00000').exists())
+        self.assertFalse(TargaRestituita.objects.filter(targa_id='AB00006').exists())
+        self.assertAllineate()
+
+    def test_rebuild_check_segnala_disallineamento(self):
+        call_command('rebuild_stato_targhe', '--check', stdout=io.StringIO())
+
+        # scrittura che aggira il queryset delle assegnazioni
+        Targa.objects.filter(numero__in=['AB00000', 'AB00008']).update(stato=Targa.STATO_RESTITUITA)
+        with self.assertRaisesMessage(CommandError, '2 targhe con stato disallineato'):
+            call_command('rebuild_stato_targhe', '--check', stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('rebuild_stato_targhe', stdout=out)
+        self.assertIn('Stato ricalcolato per 2 targhe', out.getvalue())
+        self.assertEqual(self.stato('AB00000'), Targa.STATO_ATTIVA)
+        self.assertEqual(self.stato('AB00008'), Targa.STATO_NON_ASSEGNATA)
+        call_command('rebuild_stato_targhe', '--check', stdout=io.StringIO())
+
+
+class DashboardStatsTests(FlottaTestCase):
+    """Statistiche della dashboard: cache e invalidazione dopo il commit"""
+
+    def assertCached(self):
+        with self.assertNumQueries(0):
+            return get_dashboard_stats()
+
+    def test_conteggi_in_cache(self):
+        with self.assertNumQueries(1):
+            stats = get_dashboard_stats()
+        self.assertEqual(stats, {
+            'total_veicoli': 10, 'total_targhe': 10,
+            'targhe_attive': 6, 'targhe_restituite': 2,
+            'revisioni_totali': 20, 'revisioni_positive': 10, 'revisioni_negative': 10,
+        })
+        self.assertEqual(self.assertCached(), stats)
+
+    def test_invalidazione_dopo_il_commit(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Veicolo.objects.create(
+                telaio='TELNUOVO', marca='Fiat', modello='Tipo', dataProd=date(2021, 1, 1)
+            )
+            # prima del commit la voce in cache resta quella vecchia
+            self.assertEqual(self.assertCached()['total_veicoli'], 10)
+        self.assertIsNone(cache.get(STATS_CACHE_KEY))
+        self.assertEqual(get_dashboard_stats()['total_veicoli'], 11)
+
+    def test_invalidazione_a_cascata(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Veicolo.objects.filter(telaio='TEL00000000000000').delete()
+        stats = get_dashboard_stats()
+        self.assertEqual((stats['total_veicoli'], stats['targhe_attive']), (9, 5))
+
+    def test_invalidazione_bulk_create(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            TargaAttiva.objects.bulk_create([
+                TargaAttiva(targa_id='AB00009', veicolo_id='TEL00000000000009'),
+            ])
+        self.assertEqual(get_dashboard_stats()['targhe_attive'], 7)
+
+    def test_invalidazione_update(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            TargaRestituita.objects.filter(targa_id='AB00006').update(dataRes=date(2023, 1, 1))
+        self.assertIsNone(cache.get(STATS_CACHE_KEY))
+
+
+class TextSearchTests(FlottaTestCase):
+    """Backend della ricerca testuale dei filtri (search.py)"""
+
+    def numeri(self, valore):
+        return [row['numero'] for row in self.api({'table': 'targa', 'numero': valore}).json()['data']]
+
+    @override_settings(TEXT_SEARCH_BACKEND='prefix')
+    def test_prefisso(self):
+        self.assertEqual(len(self.numeri('ab0000')), 10)
+        self.assertEqual(self.numeri('00003'), [])
+
+    @override_settings(TEXT_SEARCH_BACKEND='trigram')
+    def test_sottostringa(self):
+        self.assertEqual(self.numeri('00003'), ['AB00003'])
+
+    def test_auto_su_sqlite(self):
+        # senza indici trigram (SQLite) si cerca per prefisso
+        self.assertEqual(self.numeri('00003'), [])
+        self.assertEqual(self.numeri('ab00003'), ['AB00003'])
+
+
+class ComandiFlottaTests(TestCase):
+    """Comandi genera_dati_flotta e benchmark_endpoints su una flotta minima"""
+
+    def setUp(self):
+        cache.clear()
+        call_command(
+            'genera_dati_flotta', veicoli=10, targhe=15, revisioni=20, batch_size=4,
+            stdout=io.StringIO(),
+        )
+
+    def conteggi(self):
+        return {
+            model.__name__: model.objects.count()
+            for model in (Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita)
+        }
+
+    def benchmark(self, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark_endpoints', '--output', output, *args, stdout=io.StringIO())
+            with open(output) as f:
+                return json.load(f)
+
+    def test_genera_dati_flotta(self):
+        self.assertEqual(self.conteggi(), {
+            'Veicolo': 10, 'Targa': 15, 'Revisione': 20, 'TargaAttiva': 8, 'TargaRestituita': 3,
+        })
+        stati = dict(Targa.objects.values_list('stato').annotate(n=Count('*')))
+        self.assertEqual(stati, {
+            Targa.STATO_ATTIVA: 8, Targa.STATO_RESTITUITA: 3, Targa.STATO_NON_ASSEGNATA: 4,
+        })
+        call_command('rebuild_stato_targhe', '--check', stdout=io.StringIO())
+
+        with self.assertRaisesMessage(CommandError, '--flush'):
+            call_command('genera_dati_flotta', veicoli=1, targhe=1, revisioni=0, stdout=io.StringIO())
+        call_command(
+            'genera_dati_flotta', veicoli=3, targhe=3, revisioni=2, flush=True, stdout=io.StringIO()
+        )
+        self.assertEqual(self.conteggi()['Veicolo'], 3)
+
+    def test_report_json(self):
+        report = self.benchmark('--runs', '1', '--only', 'veicoli_api', '--label', 'test')
+
+        self.assertEqual(report['meta']['label'], 'test')
+        self.assertEqual(report['meta']['runs'], 1)
+        self.assertEqual(report['meta']['rows']['veicolo'], 10)
+        self.assertEqual(set(report['results']), {'veicoli_api'})
+        result = report['results']['veicoli_api']
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(result['url'], reverse('veicoli_api'))
+        self.assertEqual(set(result['warm_ms']), {'min', 'median', 'p95', 'max'})
+        self.assertGreater(result['queries'], 0)
+
+    def test_scritture_annullate(self):
+        prima = self.conteggi()
+        telaio = TargaAttiva.objects.order_by('veicolo_id').values_list('veicolo_id', flat=True)[0]
+        marca = Veicolo.objects.get(telaio=telaio).marca
+
+        report = self.benchmark(
+            '--runs', '1', '--only',
+            'add_veicolo_api', 'import_veicoli_api', 'update_veicolo_api', 'delete_veicolo_api',
+        )
+        self.assertEqual({r['status'] for r in report['results'].values()}, {200})
+        self.assertEqual(self.conteggi(), prima)
+        self.assertEqual(Veicolo.objects.get(telaio=telaio).marca, marca)
+
+    def test_filtri_only_e_skip(self):
+        report = self.benchmark('--runs', '1', '--only', 'veicoli_api', 'targhe_api', '--skip', 'targhe_api')
+        self.assertEqual(set(report['results']), {'veicoli_api'})
+
+    def test_runs_non_valido(self):
+        with self.assertRaisesMessage(CommandError, '--runs'):
+            self.benchmark('--runs', '0')
+
+    def test_endpoint_senza_caso(self):
+        pattern = path('nuovo/', views.dashboard, name='nuovo_endpoint')
+        with mock.patch.object(urls, 'urlpatterns', [*urls.urlpatterns, pattern]):
+            with self.assertRaisesMessage(CommandError, 'nuovo_endpoint'):
+                self.benchmark('--runs', '1')
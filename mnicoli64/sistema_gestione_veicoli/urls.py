@@ -15,6 +15,7 @@ urlpatterns = [
     # Veicoli - API per AJAX (compatibilità con frontend PHP)
     path('api/veicoli/', views.get_veicoli_data, name='veicoli_api'),
     path('api/veicoli/add/', views.add_veicolo_api, name='add_veicolo_api'),
+    path('api/veicoli/import/', views.import_veicoli_api, name='import_veicoli_api'),
     path('api/veicoli/<str:telaio>/detail/', views.get_veicolo_detail_api, name='get_veicolo_api'),
     path('api/veicoli/<str:telaio>/update/', views.update_veicolo_api, name='update_veicolo_api'),
     path('api/veicoli/<str:telaio>/delete/', views.delete_veicolo_api, name='delete_veicolo_api'),
@@ -33,4 +34,9 @@ urlpatterns = [
     path('targhe-restituite/', views.TargaRestituitaListView.as_view(), name='targhe_restituite_list'),
     
     path('api/table/', views.table_api, name='api-table'),
+    path('api/table/export/', views.table_export_api, name='api-table-export'),
+    path('api/table/facets/', views.table_facets_api, name='api-table-facets'),
+
+    # Metriche Prometheus
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
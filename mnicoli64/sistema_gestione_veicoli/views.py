@@ -1,39 +1,40 @@
 import re
+import io
+import csv
 import logging
 import json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseServerError
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseServerError, StreamingHttpResponse, QueryDict
 from django.views.decorators.http import require_http_methods, require_GET
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.core.paginator import Paginator
-from django.db.models import Case, When, Value, CharField
 
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.db import IntegrityError, transaction, DatabaseError, connection
 import json
 from datetime import datetime
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from .models import Veicolo, Targa, Revisione, TargaAttiva, TargaRestituita
+from . import metrics
 from .forms import VeicoloForm
+from .bulk_import import import_veicoli, read_rows, ImportFormatError, IMPORT_MODES
+from .stats import get_dashboard_stats
+from .table_cache import cache_table_response, cached_table_payload
+from .serialization import FastJsonResponse, ROW_FORMATS, dumps, table_payload
+from .tables import TABLES, InvalidTableRequest, get_table
 
 logger = logging.getLogger(__name__)
 
 # Homepage View
 def dashboard(request):
     """Dashboard principale del sistema"""
-    context = {
-        'total_veicoli': Veicolo.objects.count(),
-        'total_targhe': Targa.objects.count(),
-        'targhe_attive': TargaAttiva.objects.count(),
-        'targhe_restituite': TargaRestituita.objects.count(),
-        'revisioni_totali': Revisione.objects.count(),
-        'revisioni_positive': Revisione.objects.filter(esito='positivo').count(),
-        'revisioni_negative': Revisione.objects.filter(esito='negativo').count(),
-    }
+    # tutti i conteggi in una query, con cache (vedi stats.py)
+    context = get_dashboard_stats()
     return render(request, 'pages/homepage.html', context)
 
 
@@ -41,81 +42,67 @@ def dashboard(request):
 # VEICOLI VIEWS
 # =============================================================================
 
-filter_fields = [
-    'telaio', 'marca', 'modello', 'dataProd',
-    'numero', 'dataEm', 'stato', 'targa',
-    'veicolo', 'dataRev', 'dataRes', 'esito', 'motivazione'
-]
-
-# central configuration dict for each field
-FIELD_CONFIG = {
-    'telaio':      {'label': 'Numero Telaio',     'placeholder': 'Cerca per telaio...',      'type': 'text',   'icon': 'bi-upc-scan'},
-    'marca':       {'label': 'Marca',              'placeholder': 'Cerca per marca...',       'type': 'text',   'icon': 'bi-building'},
-    'modello':     {'label': 'Modello',            'placeholder': 'Cerca per modello...',     'type': 'text',   'icon': 'bi-car-front'},
-    'dataProd':    {'label': 'Data Produzione',    'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-date'},
-    'numero':      {'label': 'Numero',             'placeholder': 'Cerca per numero...',      'type': 'text',   'icon': 'bi-tag'},
-    'dataEm':      {'label': 'Data Emissione',     'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-date'},
-    'stato':       {'label': 'Stato Targa',        'placeholder': 'Seleziona stato...',       'type': 'select', 'icon': 'bi-flag',
-                    'options': [('attiva', 'Attiva'), ('restituita', 'Restituita'), ('Non assegnata', 'Non assegnata')]},
-    'targa':       {'label': 'Targa',              'placeholder': 'Cerca per targa...',       'type': 'text',   'icon': 'bi-tag'},
-    'veicolo':     {'label': 'Veicolo',            'placeholder': 'Cerca per veicolo...',     'type': 'text',   'icon': 'bi-car-front'},
-    'dataRev':     {'label': 'Data Revisione',     'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-check'},
-    'dataRes':     {'label': 'Data Restituzione',  'placeholder': 'Seleziona data...',        'type': 'date',   'icon': 'bi-calendar-x'},
-    'esito':       {'label': 'Esito Revisione',    'placeholder': 'Seleziona esito...',       'type': 'select', 'icon': 'bi-clipboard-check',
-                    'options': [('positivo', 'Positivo'), ('negativo', 'Negativo')]},
-    'motivazione': {'label': 'Motivazione',        'placeholder': 'Cerca per motivazione...', 'type': 'text',   'icon': 'bi-chat-text'},
-}
-
-VEICOLO_FIELDS = [
-    'telaio','marca','modello','dataProd',
-]
-
-TARGA_FIELDS = [
-    'numero','dataEm','stato'
-]
-
-TARGA_ATTIVA_FIELDS = [
-    'targa', 'veicolo','dataEm'
-]
-
-TARGA_RESTITUITA_FIELDS = [
-   'targa','veicolo','dataEm','dataRes'
-]
+# righe della prima pagina incorporata nelle liste (come TABLE_PAGE_SIZE in filter.js)
+INITIAL_PAGE_SIZE = 200
 
-REVISIONE_FIELDS = [
-    'numero', 'targa', 'dataRev', 'esito','motivazione'
-]
 
-class VeicoloListView(ListView):
-    model = Veicolo
-    template_name = 'pages/veicolo.html'
-    context_object_name = 'veicoli'
-    paginate_by = 20
+class TableListView(ListView):
+    """
+    ListView su una tabella del registro (tables.py): stessi filtri e stesso
+    ordinamento stabile (campo, pk) di table_api, con pannello filtri da FIELD_CONFIG.
+    Le righe arrivano solo da initial_table(): il queryset della ListView resta
+    non valutato (nessuna paginazione, quindi nessun COUNT(*) sulla tabella).
+    """
+    table = None
+    page_title = None
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        for field, cfg in FIELD_CONFIG.items():
-            val = self.request.GET.get(field)
-            if val:
-                lookup = field if cfg['input_type']=='date' else f"{field}__icontains"
-                qs = qs.filter(**{lookup: val})
-        return qs
+        table = TABLES[self.table]
+        try:
+            qs = table.queryset(self.request.GET)
+        except InvalidTableRequest:
+            # valore di un filtro non valido (es. data): nessun risultato
+            qs = table.model._default_manager.none()
+        return table.order(qs, self.request.GET)
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-
-        current = {f: self.request.GET.get(f, '') for f in VEICOLO_FIELDS}
-
+        if self.page_title:
+            ctx['page_title'] = self.page_title
         # build list of field‑configs including the current value
-        ctx['filter_fields'] = []
-        for f in VEICOLO_FIELDS:
-            if f in FIELD_CONFIG:
-                cfg = FIELD_CONFIG[f].copy()
-                cfg.update(name=f, value=current[f])
-                ctx['filter_fields'].append(cfg)
-
+        ctx['filter_fields'] = TABLES[self.table].filter_panel(self.request.GET)
+        ctx['initial_table'] = self.initial_table()
         return ctx
 
+    def initial_table(self):
+        """
+        Prima pagina di table_api per i filtri correnti, incorporata nella pagina
+        (json_script) così filter.js non deve richiederla al caricamento.
+        Passa dalla stessa cache di table_api; None se i parametri non sono validi.
+        """
+        table = TABLES[self.table]
+        params = QueryDict(mutable=True)
+        for name in [*table.params, 'sort', 'order']:
+            if value := self.request.GET.get(name):
+                params[name] = value
+        filters = params.urlencode()
+        params.update({'table': table.name, 'format': 'compact', 'limit': str(INITIAL_PAGE_SIZE)})
+
+        try:
+            payload, etag = cached_table_payload(
+                'table_api', table.name, params, table.default_params(),
+                lambda: table_page(table, params),
+            )
+        except ValueError:
+            return None
+        return {'filters': filters, 'etag': etag, 'response': payload}
+
+class VeicoloListView(TableListView):
+    model = Veicolo
+    table = 'veicolo'
+    template_name = 'pages/veicolo.html'
+    context_object_name = 'veicoli'
+
 class VeicoloDetailView(DetailView):
     model = Veicolo
     template_name = 'pages/veicoli/detail.html'
@@ -155,78 +142,10 @@ class VeicoloDeleteView(DeleteView):
 # =============================================================================
 
 @require_http_methods(["GET"])
+@cache_table_response('veicolo', defaults=lambda table: TABLES[table].default_params())
 def get_veicoli_data(request):
     """API per ottenere dati veicoli con filtri (compatibile con AJAX frontend PHP)"""
-    try:
-        # Parametri filtro
-        telaio = request.GET.get('telaio', '')
-        marca = request.GET.get('marca', '')
-        modello = request.GET.get('modello', '')
-        dataProd = request.GET.get('dataProd', '')
-        
-        # Ordinamento
-        sort = request.GET.get('sort', 'telaio')
-        order = request.GET.get('order', 'asc')
-        
-        # Query base
-        veicoli = Veicolo.objects.all()
-        
-        # Applicazione filtri
-        if telaio:
-            veicoli = veicoli.filter(telaio__icontains=telaio)
-        if marca:
-            veicoli = veicoli.filter(marca__icontains=marca)
-        if modello:
-            veicoli = veicoli.filter(modello__icontains=modello)
-        if dataProd:
-            veicoli = veicoli.filter(dataProd=dataProd)
-        
-        # Ordinamento
-        if order == 'desc':
-            sort = f'-{sort}'
-        
-        # Mapping dei campi per ordinamento
-        sort_mapping = {
-            'telaio': 'telaio',
-            'marca': 'marca',
-            'modello': 'modello',
-            'dataProd': 'dataProd',
-            '-dataProd': '-dataProd'
-        }
-        
-        if sort in sort_mapping:
-            veicoli = veicoli.order_by(sort_mapping[sort])
-        else:
-            veicoli = veicoli.order_by(sort)
-        
-        # Serializzazione
-        data = []
-        for veicolo in veicoli:
-            data.append({
-                'telaio': veicolo.telaio,
-                'marca': veicolo.marca,
-                'modello': veicolo.modello,
-                'dataProd': veicolo.dataProd.strftime('%Y-%m-%d'),
-            })
-        
-        columns = [
-            {'name': 'telaio', 'label': 'Telaio', 'isLink': True, 'linkTarget': 'veicoli'},
-            {'name': 'marca', 'label': 'Marca'},
-            {'name': 'modello', 'label': 'Modello'},
-            {'name': 'dataProd', 'label': 'Data Produzione', 'type': 'date'},
-        ]
-        
-        return JsonResponse({
-            'status': 'success',
-            'data': data,
-            'columns': columns
-        })
-        
-    except Exception as e:
-        return JsonResponse({
-            'status': 'error',
-            'message': str(e)
-        }, status=500)
+    return table_data_response(TABLES['veicolo'], request)
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -243,14 +162,14 @@ def add_veicolo_api(request):
         required_fields = ['telaio', 'marca', 'modello', 'dataProd']
         for field in required_fields:
             if not data.get(field):
-                return JsonResponse({
+                return FastJsonResponse({
                     'status': 'error',
                     'message': f'Campo {field} obbligatorio'
                 }, status=400)
         
         # Verifica unicità telaio
         if Veicolo.objects.filter(telaio=data['telaio']).exists():
-            return JsonResponse({
+            return FastJsonResponse({
                 'status': 'error',
                 'message': 'Numero di telaio già esistente'
             }, status=400)
@@ -263,13 +182,57 @@ def add_veicolo_api(request):
             dataProd=data['dataProd']
         )
         
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'success',
             'message': 'Veicolo aggiunto con successo'
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def import_veicoli_api(request):
+    """API per l'import massivo di veicoli da CSV/JSON (file `file` o corpo della richiesta)"""
+    mode = request.POST.get('mode') or request.GET.get('mode', 'skip')
+    if mode not in IMPORT_MODES:
+        return FastJsonResponse({
+            'status': 'error',
+            'message': 'Modalità non valida'
+        }, status=400)
+
+    try:
+        if 'file' in request.FILES:
+            upload = request.FILES['file']
+            fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig')
+        elif request.content_type in ('application/json', 'text/csv'):
+            fmt = 'json' if request.content_type == 'application/json' else 'csv'
+            stream = io.StringIO(request.body.decode('utf-8-sig'))
+        else:
+            return FastJsonResponse({
+                'status': 'error',
+                'message': 'Nessun file da importare'
+            }, status=400)
+
+        report = import_veicoli(read_rows(stream, fmt), mode=mode)
+
+        return FastJsonResponse({
+            'status': 'success',
+            'message': f"Importati {report['inserted']} veicoli, aggiornati {report['updated']}",
+            'report': report
+        })
+
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        return FastJsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+    except Exception as e:
+        return FastJsonResponse({
             'status': 'error',
             'message': str(e)
         }, status=500)
@@ -284,16 +247,16 @@ def get_veicolo_detail_api(request, telaio):
             'telaio': veicolo.telaio,
             'marca': veicolo.marca,
             'modello': veicolo.modello,
-            'dataProd': veicolo.dataProd.strftime('%Y-%m-%d')
+            'dataProd': veicolo.dataProd
         }
         
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'success',
             'data': data
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'error',
             'message': str(e)
         }, status=500)
@@ -323,7 +286,7 @@ def update_veicolo_api(request, telaio):
         if 'telaio' in data and data['telaio'] != veicolo.telaio:
             # Verifica unicità nuovo telaio
             if Veicolo.objects.filter(telaio=data['telaio']).exists():
-                return JsonResponse({
+                return FastJsonResponse({
                     'status': 'error',
                     'message': 'Numero di telaio già esistente'
                 }, status=400)
@@ -331,13 +294,13 @@ def update_veicolo_api(request, telaio):
         
         veicolo.save()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'success',
             'message': 'Veicolo aggiornato con successo'
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'error',
             'message': str(e)
         }, status=500)
@@ -350,13 +313,13 @@ def delete_veicolo_api(request, telaio):
         veicolo = get_object_or_404(Veicolo, telaio=telaio)
         veicolo.delete()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'success',
             'message': 'Veicolo eliminato con successo'
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'error',
             'message': str(e)
         }, status=500)
@@ -365,373 +328,210 @@ def delete_veicolo_api(request, telaio):
 # TARGHE VIEWS
 # =============================================================================
 
-class TargaListView(ListView):
+class TargaListView(TableListView):
     model = Targa
+    table = 'targa'
     template_name = 'pages/targa.html'
     context_object_name = 'targhe'
-    paginate_by = 20
-    
-    def get_queryset(self):
-        qs = super().get_queryset()
-        for field, cfg in FIELD_CONFIG.items():
-            val = self.request.GET.get(field)
-            if val:
-                lookup = field if cfg['input_type']=='date' else f"{field}__icontains"
-                qs = qs.filter(**{lookup: val})
-        return qs
+    page_title = 'Gestione Targhe'
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx['page_title'] = 'Gestione Targhe'
-        current = {f: self.request.GET.get(f, '') for f in TARGA_FIELDS}
-
-        # build list of field‑configs including the current value
-        ctx['filter_fields'] = []
-        for f in TARGA_FIELDS:
-            if f in FIELD_CONFIG:
-                cfg = FIELD_CONFIG[f].copy()
-                cfg.update(name=f, value=current[f])
-                ctx['filter_fields'].append(cfg)
-
-        return ctx
 
-class TargaAttivaListView(ListView):
+class TargaAttivaListView(TableListView):
     model = TargaAttiva
+    table = 'targa_attiva'
     template_name = 'pages/targa_attiva.html'
     context_object_name = 'targhe_attive'
-    paginate_by = 20
+    page_title = 'Gestione Targhe Attive'
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        for field, cfg in FIELD_CONFIG.items():
-            val = self.request.GET.get(field)
-            if val:
-                lookup = field if cfg['input_type']=='date' else f"{field}__icontains"
-                qs = qs.filter(**{lookup: val})
-        return qs
-
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx['page_title'] = 'Gestione Targhe Attive'
-        current = {f: self.request.GET.get(f, '') for f in TARGA_ATTIVA_FIELDS}
-
-        # build list of field‑configs including the current value
-        ctx['filter_fields'] = []
-        for f in TARGA_ATTIVA_FIELDS:
-            if f in FIELD_CONFIG:
-                cfg = FIELD_CONFIG[f].copy()
-                cfg.update(name=f, value=current[f])
-                ctx['filter_fields'].append(cfg)
-
-        return ctx
 
 @require_http_methods(["GET"])
+@cache_table_response('targa', defaults=lambda table: TABLES[table].default_params())
 def get_targhe_data(request):
     """API per ottenere dati targhe con filtri"""
+    return table_data_response(TABLES['targa'], request)
+
+# righe lette per ogni fetch del cursore lato server durante l'export
+EXPORT_CHUNK_SIZE = 2000
+
+
+def table_data_response(table, request):
+    """Tutte le righe filtrate e ordinate di `table`, senza paginazione (get_*_data)"""
+    row_format = request.GET.get('format', 'objects')
+    if row_format not in ROW_FORMATS:
+        return FastJsonResponse({
+            'status': 'error',
+            'message': 'Formato non valido'
+        }, status=400)
+
     try:
-        # Parametri filtro
-        numero = request.GET.get('numero', '')
-        dataEm = request.GET.get('dataEm', '')
-        stato = request.GET.get('stato', '')
-        
-        # Ordinamento
-        sort = request.GET.get('sort', 'numero')
-        order = request.GET.get('order', 'asc')
-        
-        # Query base con JOIN per stato
-        targhe = Targa.objects.all()
-        
-        # Applicazione filtri
-        if numero:
-            targhe = targhe.filter(numero__icontains=numero)
-        if dataEm:
-            targhe = targhe.filter(dataEm=dataEm)
-        
-        # Ordinamento
-        if order == 'desc':
-            sort = f'-{sort}'
-        targhe = targhe.order_by(sort)
-        
-        # Serializzazione con stato
-        data = []
-        for targa in targhe:
-            stato_targa = targa.stato
-            if not stato or stato_targa == stato:
-                data.append({
-                    'numero': targa.numero,
-                    'dataEm': targa.dataEm.strftime('%Y-%m-%d'),
-                    'stato': stato_targa
-                })
-        
-        columns = [
-            {'name': 'numero', 'label': 'Numero', 'isLink': True, 'linkTarget': 'targhe'},
-            {'name': 'dataEm', 'label': 'Data Emissione', 'type': 'date'},
-            {'name': 'stato', 'label': 'Stato', 'type': 'status'}
-        ]
-        
-        return JsonResponse({
-            'status': 'success',
-            'data': data,
-            'columns': columns
-        })
-        
+        paginator = table.paginator(request.GET)
+        qs = paginator.order(table.queryset(request.GET))
+    except ValueError as e:
+        return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    try:
+        # tuple dal database, date convertite dal serializer
+        rows = qs.values_list(*table.fields)
+        return FastJsonResponse(table_payload(rows, table.column_definitions, row_format))
+
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'status': 'error',
             'message': str(e)
         }, status=500)
 
+
+def table_page(table, params):
+    """
+    Una pagina di `table` (dal cursore, se presente) nel formato di table_api;
+    usata anche per la prima pagina incorporata nelle liste (TableListView).
+    Solleva ValueError per parametri non validi.
+    """
+    qs, fields, columns, paginator = table.plan(params)
+
+    # sorting + keyset pagination
+    qs = paginator.paginate(qs, params.get('cursor'))
+    rows, next_cursor = paginator.page(qs.values_list(*fields, 'page_key', 'page_pk'))
+
+    metrics.TABLE_ROWS.labels(table.name).observe(len(rows))
+
+    return table_payload(
+        rows, columns, params.get('format', 'objects'), next_cursor=next_cursor
+    )
+
+
 @require_http_methods(["GET"])
+@cache_table_response(defaults=lambda table: TABLES[table].default_params())
 def table_api(request):
-    table   = request.GET.get('table', '')
-    sort    = request.GET.get('sort')
-    order   = request.GET.get('order', 'asc').lower()
-    order   = '-' if order == 'desc' else ''
+    row_format = request.GET.get('format', 'objects')
+
+    if row_format not in ROW_FORMATS:
+        return FastJsonResponse({'status':'error','message':'Formato non valido'}, status=400)
 
     try:
-        data = []
-        columns = []
-
-        if table == 'veicolo':
-            qs = Veicolo.objects.all()
-
-            # filters
-            if telaio := request.GET.get('telaio'):
-                qs = qs.filter(telaio__icontains=telaio)
-            if marca := request.GET.get('marca'):
-                qs = qs.filter(marca__icontains=marca)
-            if modello := request.GET.get('modello'):
-                qs = qs.filter(modello__icontains=modello)
-            if dataProd := request.GET.get('dataProd'):
-                qs = qs.filter(dataProd=dataProd)
-
-            # sorting
-            if sort:
-                qs = qs.order_by(f"{order}{sort}")
-
-            # serialize
-            data = list(qs.values('telaio', 'marca', 'modello', 'dataProd'))
-
-            # columns definition
-            columns = [
-                {'name':'telaio','label':'Telaio','isLink':True,'linkTarget':'veicoli'},
-                {'name':'marca','label':'Marca'},
-                {'name':'modello','label':'Modello'},
-                {'name':'dataProd','label':'Data Produzione','type':'date'},
-            ]
-
-        elif table == 'targa':
-            # annotate stato with CASE
-            qs = (
-                Targa.objects
-                .annotate(
-                    stato=Case(
-                        When(targaattiva__targa__isnull=False, then=Value('Attiva')),
-                        When(targarestituita__targa__isnull=False, then=Value('Restituita')),
-                        default=Value('Non assegnata'),
-                        output_field=CharField()
-                    )
-                )
-            )
+        table = get_table(request.GET.get('table', ''))
+        # serialize
+        return FastJsonResponse(table_page(table, request.GET))
 
-            if numero := request.GET.get('numero'):
-                qs = qs.filter(numero__icontains=numero)
-            if dataEm := request.GET.get('dataEm'):
-                qs = qs.filter(dataEm=dataEm)
-            if stato := request.GET.get('stato'):
-                qs = qs.filter(stato=stato)
-
-            if sort:
-                qs = qs.order_by(f"{order}{sort}")
-
-            data = list(qs.values('numero', 'dataEm', 'stato'))
-
-            columns = [
-                {'name':'numero','label':'Numero','isLink':True,'linkTarget':'targhe'},
-                {'name':'dataEm','label':'Data Emissione','type':'date'},
-                {'name':'stato','label':'Stato','type':'status'},
-            ]
-
-        elif table == 'revisione':
-            qs = Revisione.objects.all()
-
-            if numero := request.GET.get('numero'):
-                qs = qs.filter(numero__icontains=numero)
-            if targa := request.GET.get('targa'):
-                qs = qs.filter(targa__numero__icontains=targa)
-            if dataRev := request.GET.get('dataRev'):
-                qs = qs.filter(dataRev=dataRev)
-            if esito := request.GET.get('esito'):
-                qs = qs.filter(esito=esito)
-            if motivazione := request.GET.get('motivazione'):
-                qs = qs.filter(motivazione__icontains=motivazione)
-
-            if sort:
-                qs = qs.order_by(f"{order}{sort}")
-
-            data = list(qs.values('numero', 'targa', 'dataRev', 'esito', 'motivazione'))
-
-            columns = [
-                {'name':'numero','label':'Numero'},
-                {'name':'targa','label':'Targa','isLink':True,'linkTarget':'targhe'},
-                {'name':'dataRev','label':'Data Revisione','type':'date'},
-                {'name':'esito','label':'Esito'},
-                {'name':'motivazione','label':'Motivazione'},
-            ]
-
-        elif table == 'targa_attiva':
-            qs = (
-                TargaAttiva.objects
-                .select_related('targa','veicolo')
-                .all()
-            )
-            if targa := request.GET.get('targa'):
-                qs = qs.filter(targa__numero__icontains=targa)
-            if veicolo := request.GET.get('veicolo'):
-                qs = qs.filter(veicolo__telaio__icontains=veicolo)
-            if dataEm := request.GET.get('dataEm'):
-                qs = qs.filter(targa__dataEm=dataEm)
-
-            if sort:
-                qs = qs.order_by(f"{order}{sort}")
-                
-            # annotate joins
-            data = []
-            for ta in qs:
-                data.append({
-                    'targa':   ta.targa.numero,
-                    'veicolo': ta.veicolo.telaio,
-                    'marca':   ta.veicolo.marca,
-                    'modello': ta.veicolo.modello,
-                    'dataEm':  ta.targa.dataEm,
-                })
-
-            columns = [
-                {'name':'targa','label':'Targa','isLink':True,'linkTarget':'targhe'},
-                {'name':'veicolo','label':'Telaio Veicolo','isLink':True,'linkTarget':'veicoli'},
-                {'name':'marca','label':'Marca'},
-                {'name':'modello','label':'Modello'},
-                {'name':'dataEm','label':'Data Emissione','type':'date'},
-            ]
-
-        elif table == 'targa_restituita':
-            qs = (
-                TargaRestituita.objects
-                .select_related('targa','veicolo')
-                .all()
-            )
-            
-            if targa := request.GET.get('targa'):
-                qs = qs.filter(targa__numero__icontains=targa)
-            if veicolo := request.GET.get('veicolo'):
-                qs = qs.filter(veicolo__telaio__icontains=veicolo)
-            if dataEm := request.GET.get('dataEm'):
-                qs = qs.filter(targa__dataEm=dataEm)
-            if dataRes := request.GET.get('dataRes'):
-                qs = qs.filter(dataRes=dataRes)
-
-            if sort:
-                qs = qs.order_by(f"{order}{sort}")
-
-            data = []
-            for tr in qs:
-                data.append({
-                    'targa':   tr.targa.numero,
-                    'veicolo': tr.veicolo.telaio,
-                    'marca':   tr.veicolo.marca,
-                    'modello': tr.veicolo.modello,
-                    'dataEm':  tr.targa.dataEm,
-                    'dataRes': tr.dataRes,
-                })
-
-            columns = [
-                {'name':'targa','label':'Targa','isLink':True,'linkTarget':'targhe'},
-                {'name':'veicolo','label':'Telaio Veicolo','isLink':True,'linkTarget':'veicoli'},
-                {'name':'marca','label':'Marca'},
-                {'name':'modello','label':'Modello'},
-                {'name':'dataEm','label':'Data Emissione','type':'date'},
-                {'name':'dataRes','label':'Data Restituzione','type':'date'},
-            ]
+    except ValueError as e:
+        # tabella, ordinamento, campi o cursore non validi
+        return FastJsonResponse({
+            'status':  'error',
+            'message': str(e)
+        }, status=400)
+    except Exception as e:
+        return FastJsonResponse({
+            'status':  'error',
+            'message': str(e)
+        }, status=500)
 
-        else:
-            return HttpResponseBadRequest(
-                JsonResponse({'status':'error','message':'Tabella non valida'})
-            )
 
-        return JsonResponse({
-            'status':  'success',
-            'data':    data,
-            'columns': columns
-        }, json_dumps_params={'ensure_ascii': False})
+@require_http_methods(["GET"])
+@cache_table_response()
+def table_facets_api(request):
+    """
+    Conteggi per il pannello filtri (stato, esito, anni, marche) con i filtri
+    correnti; `facets=a,b` limita il calcolo ai facet indicati.
+    """
+    try:
+        table = get_table(request.GET.get('table', ''))
+    except ValueError as e:
+        return FastJsonResponse({'status':'error','message':str(e)}, status=400)
 
+    try:
+        return FastJsonResponse({
+            'status': 'success',
+            'facets': table.facet_counts(request.GET),
+        })
+    except ValueError as e:
+        return FastJsonResponse({'status':'error','message':str(e)}, status=400)
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'status':  'error',
             'message': str(e)
         }, status=500)
+
+
+class Echo:
+    """Buffer fittizio per csv.writer: restituisce la riga invece di accumularla"""
+
+    def write(self, value):
+        return value
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _export_rows(qs, fields, columns, fmt):
+    names = [col['name'] for col in columns]
+    # cursore lato server: le righe arrivano a blocchi, la memoria resta costante
+    rows = qs.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield dumps(dict(zip(names, row))) + b'\n'
+
+
+@require_http_methods(["GET"])
+def table_export_api(request):
+    """Export in streaming (CSV o NDJSON) di una tabella con gli stessi filtri e ordinamento di table_api"""
+    fmt = request.GET.get('format', 'csv').lower()
+
+    if fmt not in EXPORT_FORMATS:
+        return FastJsonResponse({'status':'error','message':'Formato non valido'}, status=400)
+
+    try:
+        table = get_table(request.GET.get('table', ''))
+        qs, fields, columns, paginator = table.plan(request.GET)
+    except ValueError as e:
+        return FastJsonResponse({'status':'error','message':str(e)}, status=400)
+    qs = paginator.order(qs)
+
+    response = StreamingHttpResponse(
+        _export_rows(qs, fields, columns, fmt),
+        content_type=EXPORT_FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{table.name}.{fmt}"'
+    return response
+
 # =============================================================================
 # ALTRE VIEWS (Revisioni, TargheAttive, TargheRestituite)
 # =============================================================================
 
-class RevisioneListView(ListView):
+class RevisioneListView(TableListView):
     model = Revisione
+    table = 'revisione'
     template_name = 'pages/revisione.html'
     context_object_name = 'revisioni'
-    paginate_by = 20
-    
-    def get_queryset(self):
-        qs = super().get_queryset()
-        for field, cfg in FIELD_CONFIG.items():
-            val = self.request.GET.get(field)
-            if val:
-                lookup = field if cfg['input_type']=='date' else f"{field}__icontains"
-                qs = qs.filter(**{lookup: val})
-        return qs
-
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx['page_title'] = 'Gestione Revisioni'
-        current = {f: self.request.GET.get(f, '') for f in REVISIONE_FIELDS}
-
-        # build list of field‑configs including the current value
-        ctx['filter_fields'] = []
-        for f in REVISIONE_FIELDS:
-            if f in FIELD_CONFIG:
-                cfg = FIELD_CONFIG[f].copy()
-                cfg.update(name=f, value=current[f])
-                ctx['filter_fields'].append(cfg)
+    page_title = 'Gestione Revisioni'
 
-        return ctx
 
-class TargaRestituitaListView(ListView):
+class TargaRestituitaListView(TableListView):
     model = TargaRestituita
+    table = 'targa_restituita'
     template_name = 'pages/targa_restituita.html'
     context_object_name = 'targhe_restituite'
-    paginate_by = 20
-    
-    def get_queryset(self):
-        qs = super().get_queryset()
-        for field, cfg in FIELD_CONFIG.items():
-            val = self.request.GET.get(field)
-            if val:
-                lookup = field if cfg['input_type']=='date' else f"{field}__icontains"
-                qs = qs.filter(**{lookup: val})
-        return qs
+    page_title = 'Gestione  Restituite'
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx['page_title'] = 'Gestione  Restituite'
-        current = {f: self.request.GET.get(f, '') for f in TARGA_RESTITUITA_FIELDS}
 
-        # build list of field‑configs including the current value
-        ctx['filter_fields'] = []
-        for f in TARGA_RESTITUITA_FIELDS:
-            if f in FIELD_CONFIG:
-                cfg = FIELD_CONFIG[f].copy()
-                cfg.update(name=f, value=current[f])
-                ctx['filter_fields'].append(cfg)
+# =============================================================================
+# METRICHE
+# =============================================================================
 
-        return ctx
+@require_GET
+def metrics_view(request):
+    """Endpoint Prometheus (/metrics), solo per gli scraper autorizzati"""
+    if not metrics.metrics_access_allowed(request):
+        return HttpResponseForbidden('Accesso alle metriche non consentito')
+    return HttpResponse(metrics.render_metrics(), content_type=CONTENT_TYPE_LATEST)
 
 # =============================================================================
 # AUTH VIEWS CUSTOM